@@ -0,0 +1,42 @@
+import math
+import timeit
+import numpy as np
+import typer
+from converter.group import split_group
+from tileset import Tile
+from utils import Box3
+
+app = typer.Typer()
+
+
+def synthetic_tiles(count, *, parts=20, seed=0):
+    # 每个外壳内放若干小零件，模拟"大外壳包含大量小零件"的模型
+    rng = np.random.default_rng(seed)
+    tiles = []
+    enclosures = max(count // (parts + 1), 1)
+    for _ in range(enclosures):
+        center = rng.uniform(-1000, 1000, 3)
+        half = rng.uniform(5, 20, 3)
+        tiles.append(Tile(box=Box3(center - half, center + half)))
+        for _ in range(min(parts, count - len(tiles))):
+            c = center + rng.uniform(-0.8, 0.8, 3) * half
+            h = rng.uniform(0.05, 0.2, 3) * half
+            tiles.append(Tile(box=Box3(c - h, c + h)))
+    tiles.sort(key=lambda tile: tile.box_world.diagonal)
+    return tiles
+
+
+@app.command()
+def main(sizes: str = typer.Option("1000,2000,4000,8000,16000,32000", help="comma separated tile counts")):
+    """measure split_group scaling on synthetic enclosure models"""
+    for count in map(int, sizes.split(",")):
+        tiles = synthetic_tiles(count)
+        start = timeit.default_timer()
+        split_group(tiles)
+        elapsed = timeit.default_timer() - start
+        typer.echo(f"{count:>8} tiles: {elapsed:8.3f}s  "
+                   f"{elapsed / (count * math.log2(count)) * 1e6:6.3f}us per n*log2(n)")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,130 @@
+import json
+import platform
+import tempfile
+import timeit
+from pathlib import Path
+import typer
+from converter.bvh import Bvh, build
+from converter.group import split_group
+from converter.gltf_to_tileset import explicit_tiles
+from converter.writer import write_contents
+from gltf import Slicer, io
+from tileset import Tile, Tileset, Format
+from .synthetic import generate
+
+app = typer.Typer()
+
+STAGES = ("read_gltf", "slicer", "slice_mesh", "split_group", "build_bvh", "tileset_dict", "write_contents")
+
+
+def run_once(fin, out, bvh=Bvh.SAH, content_format=Format.B3DM, split_triangles=0):
+    """按转换流程依次执行各阶段一次，返回 {阶段: 秒}"""
+    times = {}
+
+    def stage(name, fn):
+        start = timeit.default_timer()
+        ret = fn()
+        times[name] = timeit.default_timer() - start
+        return ret
+
+    # Tile.format 是类属性，用完恢复，不影响之后的用例与调用方
+    saved, Tile.format = Tile.format, content_format
+    try:
+        gltf, buffers = stage("read_gltf", lambda: io.read_gltf(fin))
+        slicer = stage("slicer", lambda: Slicer(gltf, buffers=buffers))
+        # 切分并编码为字节段，不写盘
+        stage("slice_mesh", lambda: [slicer.slice_mesh(id).segments() for id in range(slicer.meshes_count)])
+        tiles = explicit_tiles(slicer, [[id] for id in range(slicer.meshes_count)], 0, 0, split_triangles, 0)
+        tiles.sort(key=lambda tile: tile.box_world.diagonal)
+        grouped = stage("split_group", lambda: split_group(tiles))
+        root = stage("build_bvh", lambda: build(grouped, bvh))
+        root.refine = "ADD"
+        stage("tileset_dict", lambda: json.dumps(Tileset(root).dict, separators=(",", ":")))
+        stage("write_contents", lambda: write_contents(tiles, slicer, Path(out)))
+        return times
+    finally:
+        Tile.format = saved
+
+
+def run(params, repeat=3, bvh=Bvh.SAH, options=None):
+    """生成输入后重复执行整个流程，每个阶段取最快的一次；options 为 run_once 的转换选项"""
+    options = options or {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fin = generate(Path(tmp) / "input" / "model.gltf", **params)
+        runs = []
+        for index in range(repeat):
+            out = Path(tmp) / f"out{index}"
+            out.mkdir()
+            runs.append(run_once(fin, out, bvh, **options))
+    return {name: min(times[name] for times in runs) for name in STAGES}
+
+
+def compare(results, baseline, tolerance):
+    """与基线逐阶段比较，返回超出 tolerance 倍的 [(用例, 阶段, 基线秒, 本次秒)]"""
+    def key(case):
+        return json.dumps([case["params"], case.get("options", {})], sort_keys=True)
+
+    baseline_cases = {key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = baseline_cases.get(key(case))
+        if old is None:
+            continue
+        for name, seconds in case["stages"].items():
+            before = old["stages"].get(name)
+            if before and seconds > before * tolerance:
+                regressions.append((case["name"], name, before, seconds))
+    return regressions
+
+
+def cases(meshes, instances, depth, vertices):
+    """{用例: (输入参数, 转换选项)}：基本用例，共用 bufferView 与两种纹理的变体，以及多实例 mesh 切分后的 glb 内容"""
+    base = dict(meshes=meshes, instances=instances, depth=depth, vertices=vertices,
+                shared_views=False, texture="none")
+    return {
+        "separate_views": (base, {}),
+        "shared_views": ({**base, "shared_views": True}, {}),
+        "embedded_texture": ({**base, "texture": "embedded"}, {}),
+        "external_texture": ({**base, "texture": "external"}, {}),
+        "split_instanced_glb": ({**base, "instances": max(instances, 2)},
+                                {"content_format": Format.GLB, "split_triangles": max(vertices // 2, 1)}),
+    }
+
+
+@app.command()
+def main(
+        output: str = typer.Option("benchmark.json", help="write results to this json file"),
+        baseline: str = typer.Option(None, help="compare against results stored by an earlier run"),
+        tolerance: float = typer.Option(1.25, help="report stages slower than baseline by this factor"),
+        meshes: int = typer.Option(500, help="number of distinct meshes"),
+        instances: int = typer.Option(1, help="number of nodes referencing each mesh"),
+        depth: int = typer.Option(3, help="depth of the node hierarchy"),
+        vertices: int = typer.Option(256, help="approximate vertices per mesh"),
+        repeat: int = typer.Option(3, help="runs per case, the fastest is kept"),
+        bvh: Bvh = typer.Option(Bvh.SAH, help="algorithm used to build the bounding volume hierarchy")):
+    """time each conversion stage on synthetic gltf inputs"""
+    results = {"python": platform.python_version(), "machine": platform.machine(), "bvh": bvh.value, "cases": []}
+    for name, (params, options) in cases(meshes, instances, depth, vertices).items():
+        stages = run(params, repeat, bvh, options)
+        case = {"name": name, "params": params, "stages": stages}
+        if options:
+            case["options"] = {key: getattr(value, "value", value) for key, value in options.items()}
+        results["cases"].append(case)
+        typer.echo(name)
+        for stage, seconds in stages.items():
+            typer.echo(f"  {stage:<16}{seconds:10.4f}s")
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        for case, stage, before, seconds in regressions:
+            typer.echo(f"regression: {case} {stage} {before:.4f}s -> {seconds:.4f}s ({seconds / before:.2f}x)")
+        if regressions:
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
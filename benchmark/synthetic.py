@@ -0,0 +1,182 @@
+import json
+import math
+import struct
+import zlib
+from pathlib import Path
+import numpy as np
+import typer
+import utils
+
+app = typer.Typer()
+
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TEXTURES = ("none", "embedded", "external")
+
+
+def png(size=64, seed=0):
+    """不依赖图像库的最小 RGB png，棋盘格加随机色"""
+    rng = np.random.default_rng(seed)
+    cells = (np.indices((size, size)).sum(axis=0) // 8) % 2
+    pixels = np.where(cells[..., None], rng.integers(0, 256, 3), 255).astype(np.uint8)
+    raw = b"".join(b"\0" + row.tobytes() for row in pixels)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def sphere(vertices, rng):
+    """约 vertices 个顶点的扰动球面网格：(顶点, 法线, 纹理坐标, 索引)"""
+    n = max(int(math.sqrt(vertices)), 3)
+    u, v = np.meshgrid(np.linspace(0, np.pi, n), np.linspace(0, 2 * np.pi, n), indexing="ij")
+    directions = np.stack([np.sin(u) * np.cos(v), np.cos(u), np.sin(u) * np.sin(v)], axis=-1).reshape(-1, 3)
+    radius = 1 + 0.1 * rng.standard_normal(len(directions))
+    positions = directions * radius[:, None] * rng.uniform(0.5, 2, 3)
+    uvs = np.stack([v / (2 * np.pi), u / np.pi], axis=-1).reshape(-1, 2)
+    grid = np.arange(n * n).reshape(n, n)
+    a, b, c, d = grid[:-1, :-1], grid[:-1, 1:], grid[1:, :-1], grid[1:, 1:]
+    indices = np.stack([a, c, b, b, c, d], axis=-1).reshape(-1)
+    return positions.astype("<f4"), directions.astype("<f4"), uvs.astype("<f4"), indices
+
+
+def generate(fout, meshes=100, instances=1, depth=1, vertices=256, shared_views=False, texture="none", seed=0):
+    """写出合成的 glTF 与 .bin（和外部纹理），返回 glTF 路径
+
+    meshes 个不同的 mesh，每个被 instances 个节点引用；节点挂在 depth 层的分组节点下。
+    shared_views 时同类属性共用一个 bufferView（accessor 带 byteOffset），否则每个 accessor 一个 bufferView。
+    texture 为 none、embedded（图片放在 bufferView 中）或 external（单独的 png 文件）
+    """
+    if texture not in TEXTURES:
+        raise ValueError(f"texture must be one of {TEXTURES}")
+    fout = Path(fout)
+    fout.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    chunks, buffer_views, accessors = [], [], []
+    offset = 0
+
+    def add_view(data, target=None, byte_stride=None):
+        nonlocal offset
+        chunks.append(data + b"\0" * (utils.padded_len(len(data)) - len(data)))
+        view = {"buffer": 0, "byteOffset": offset, "byteLength": len(data)}
+        if target:
+            view["target"] = target
+        if byte_stride:
+            view["byteStride"] = byte_stride
+        buffer_views.append(view)
+        offset += utils.padded_len(len(data))
+        return len(buffer_views) - 1
+
+    geometries = [sphere(vertices, rng) for _ in range(meshes)]
+    # 每个 mesh 的 (POSITION, NORMAL, TEXCOORD_0, indices) accessor
+    attributes = []
+    if shared_views:
+        # 同类数据依次拼在一个 bufferView 中
+        for kind, target, stride in ((0, ARRAY_BUFFER, 12), (1, ARRAY_BUFFER, 12), (2, ARRAY_BUFFER, 8),
+                                     (3, ELEMENT_ARRAY_BUFFER, None)):
+            arrays = [geometry[kind] for geometry in geometries]
+            if kind == 3:
+                arrays = [array.astype("<u4") for array in arrays]
+            view = add_view(b"".join(array.tobytes() for array in arrays), target, stride)
+            byte_offset = 0
+            for index, array in enumerate(arrays):
+                if kind == 0:
+                    attributes.append([])
+                attributes[index].append((view, byte_offset, array))
+                byte_offset += array.nbytes
+    else:
+        for positions, normals, uvs, indices in geometries:
+            indices = indices.astype("<u4")
+            attributes.append([(add_view(array.tobytes(), target), 0, array) for array, target in (
+                (positions, ARRAY_BUFFER), (normals, ARRAY_BUFFER), (uvs, ARRAY_BUFFER),
+                (indices, ELEMENT_ARRAY_BUFFER))])
+
+    gltf_meshes = []
+    for mesh in attributes:
+        ids = []
+        for kind, (view, byte_offset, array) in enumerate(mesh):
+            accessor = {"bufferView": view, "componentType": UNSIGNED_INT if kind == 3 else FLOAT,
+                        "count": len(array), "type": ("VEC3", "VEC3", "VEC2", "SCALAR")[kind]}
+            if byte_offset:
+                accessor["byteOffset"] = byte_offset
+            if kind == 0:
+                accessor["min"] = array.min(axis=0).tolist()
+                accessor["max"] = array.max(axis=0).tolist()
+            accessors.append(accessor)
+            ids.append(len(accessors) - 1)
+        primitive = {"attributes": {"POSITION": ids[0], "NORMAL": ids[1], "TEXCOORD_0": ids[2]},
+                     "indices": ids[3], "material": 0}
+        gltf_meshes.append({"primitives": [primitive]})
+
+    material = {"pbrMetallicRoughness": {"baseColorFactor": [0.8, 0.8, 0.8, 1.0]}}
+    gltf = {"asset": {"version": "2.0", "generator": "gltf-to-3d-tiles benchmark"}, "scene": 0}
+    if texture != "none":
+        image = png(seed=seed)
+        if texture == "embedded":
+            gltf["images"] = [{"bufferView": add_view(image), "mimeType": "image/png"}]
+        else:
+            (fout.parent / f"{fout.stem}.png").write_bytes(image)
+            gltf["images"] = [{"uri": f"{fout.stem}.png"}]
+        gltf["samplers"] = [{}]
+        gltf["textures"] = [{"source": 0, "sampler": 0}]
+        material["pbrMetallicRoughness"]["baseColorTexture"] = {"index": 0}
+
+    # 实例随机散布在边长随数量增长的立方体中，分组节点只带平移
+    nodes = []
+    extent = 10 * math.ceil((meshes * instances) ** (1 / 3))
+    leaves = []
+    for mesh_id in range(meshes):
+        for _ in range(instances):
+            angle = rng.uniform(0, 2 * math.pi)
+            nodes.append({"mesh": mesh_id, "translation": rng.uniform(0, extent, 3).tolist(),
+                          "rotation": [0, math.sin(angle / 2), 0, math.cos(angle / 2)]})
+            leaves.append(len(nodes) - 1)
+    roots = leaves
+    for _ in range(max(depth - 1, 0)):
+        # 每层把 8 个节点收为一组
+        groups = []
+        for start in range(0, len(roots), 8):
+            nodes.append({"children": roots[start:start + 8], "translation": [0.0, 0.0, 0.0]})
+            groups.append(len(nodes) - 1)
+        roots = groups
+
+    data = b"".join(chunks)
+    bin_path = fout.with_suffix(".bin")
+    bin_path.write_bytes(data)
+    gltf.update({
+        "scenes": [{"nodes": roots}],
+        "nodes": nodes,
+        "meshes": gltf_meshes,
+        "materials": [material],
+        "accessors": accessors,
+        "bufferViews": buffer_views,
+        "buffers": [{"uri": bin_path.name, "byteLength": len(data)}]
+    })
+    with open(fout, "w") as f:
+        json.dump(gltf, f, separators=(",", ":"))
+    return fout
+
+
+@app.command()
+def main(
+        fout: str = typer.Argument(..., help="output gltf path"),
+        meshes: int = typer.Option(100, help="number of distinct meshes"),
+        instances: int = typer.Option(1, help="number of nodes referencing each mesh"),
+        depth: int = typer.Option(1, help="depth of the node hierarchy"),
+        vertices: int = typer.Option(256, help="approximate vertices per mesh"),
+        shared_views: bool = typer.Option(False, help="pack all meshes into shared bufferViews"),
+        texture: str = typer.Option("none", help="none, embedded or external base color texture"),
+        seed: int = typer.Option(0, help="random seed")):
+    """generate a synthetic gltf for benchmarks"""
+    generate(fout, meshes, instances, depth, vertices, shared_views, texture, seed)
+    typer.echo(f"written {fout}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1 +1,2 @@
 from .gltf_to_tileset import gltf_to_tileset
+from .bvh import Bvh
@@ -0,0 +1,65 @@
+import numpy as np
+from tileset import Tile
+from utils import Box3, Matrix4
+from gltf.slicer import get__attributes
+from .bvh import morton_codes
+
+
+def mesh_size(slicer, mesh_id):
+    """mesh 引用的 buffer 字节数与顶点数"""
+    primitives = slicer.meshes[mesh_id].primitives
+    deps = slicer.dependencies(primitives)
+    byte_len = sum(slicer.buffer_views[id].byte_length for id in deps.buffer_views)
+    vertices = sum(slicer.accessors[get__attributes(p)["POSITION"]].count for p in primitives)
+    return byte_len, vertices
+
+
+def world_box(slicer, mesh_id):
+    return slicer.get_bounding_box(mesh_id).apply_matrix4(slicer.get_matrices(mesh_id)[0])
+
+
+def batch_meshes(slicer, groups, max_bytes=0, max_vertices=0):
+    """把单实例的小 mesh 按 Morton 序依次合批，直到达到字节或顶点上限；返回 (批次, 未合批的分组)"""
+    candidates = [group[0] for group in groups
+                  if len(group) == 1 and len(slicer.get_matrices(group[0])) == 1]
+    if not candidates or not (max_bytes or max_vertices):
+        return [], groups
+
+    sizes = [mesh_size(slicer, id) for id in candidates]
+    centers = np.array([world_box(slicer, id).center for id in candidates], dtype=np.float64)
+    # Morton 序上相邻的 mesh 在空间上也相邻
+    order = np.argsort(morton_codes(centers), kind="stable")
+
+    batches = []
+    batch, byte_len, vertices = [], 0, 0
+    for i in order:
+        size_bytes, size_vertices = sizes[i]
+        if batch and ((max_bytes and byte_len + size_bytes > max_bytes) or
+                      (max_vertices and vertices + size_vertices > max_vertices)):
+            batches.append(batch)
+            batch, byte_len, vertices = [], 0, 0
+        batch.append(candidates[i])
+        byte_len += size_bytes
+        vertices += size_vertices
+    batches.append(batch)
+
+    # 只有一个 mesh 的批次照常输出
+    batches = [batch for batch in batches if len(batch) > 1]
+    batched = set(id for batch in batches for id in batch)
+    return batches, [group for group in groups if group[0] not in batched]
+
+
+def batch_tile(slicer, mesh_ids):
+    box = Box3()
+    for id in mesh_ids:
+        box.union(world_box(slicer, id))
+    extras = [(slicer.get_extras(id) or [None])[0] for id in mesh_ids]
+    return Tile(
+        content_id=mesh_ids[0],
+        instance_box=box,
+        instances_matrices=np.empty((0, 4, 4)),
+        matrix=Matrix4(),
+        extras=extras if any(row is not None for row in extras) else None,
+        batch=mesh_ids,
+        batch_matrices=[Matrix4(slicer.get_matrices(id)[0]) for id in mesh_ids]
+    )
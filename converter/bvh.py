@@ -0,0 +1,247 @@
+import math
+from enum import Enum
+import numpy as np
+from tileset import Tile
+from utils import BoxArray
+from utils.box import surface_area
+
+LEAF_SIZE = 3
+BINS = 16
+MORTON_BITS = 10
+
+
+class Bvh(str, Enum):
+    SAH = "sah"
+    BINNED = "binned"
+    MORTON = "morton"
+
+
+def build_bvh(tiles):
+    boxes = tile_boxes(tiles)
+    return __build_sah(tiles, boxes, boxes.center, np.arange(len(tiles)))
+
+
+def __build_sah(tiles, boxes, centers, members):
+    # 逐个划分点的 SAH：每个轴上排序后用前缀/后缀并集一次算出所有划分的代价
+    if len(members) < 3:
+        return Tile().add_children([tiles[i] for i in members])
+
+    split = -1
+    min_cost = math.inf
+    split_members = None
+    counts = np.arange(1, len(members))
+    for axis in range(3):
+        sorted_members = members[np.argsort(centers[members, axis], kind="stable")]
+        sorted_boxes = boxes[sorted_members]
+        left_cost = sah_cost(sorted_boxes.accumulate()[:-1].size, counts)
+        right_cost = sah_cost(sorted_boxes.accumulate(reverse=True)[1:].size, counts[::-1])
+        costs = left_cost + right_cost
+        min_cost_axis = costs.min()
+        if min_cost_axis < min_cost:
+            min_cost = min_cost_axis
+            split = np.argmin(costs) + 1
+            split_members = sorted_members
+
+    return Tile().add_child(__build_sah(tiles, boxes, centers, split_members[:split])).add_child(
+        __build_sah(tiles, boxes, centers, split_members[split:]))
+
+
+def sah_cost(size, count):
+    return surface_area(size) * count
+
+
+def tile_boxes(tiles):
+    return BoxArray.from_boxes(tile.box_world for tile in tiles)
+
+
+def build(tiles, method: Bvh = Bvh.SAH):
+    if method is Bvh.BINNED:
+        return build_binned_bvh(tiles)
+    if method is Bvh.MORTON:
+        return build_morton_bvh(tiles)
+    return build_bvh(tiles)
+
+
+def build_binned_bvh(tiles, bins=BINS):
+    boxes = tile_boxes(tiles)
+    return tree_to_tiles(tiles, binned_sah_tree(boxes.min, boxes.max, bins=bins))
+
+
+def build_morton_bvh(tiles):
+    boxes = tile_boxes(tiles)
+    return tree_to_tiles(tiles, morton_tree(boxes.min, boxes.max))
+
+
+def tree_to_tiles(tiles, tree):
+    order, start, end, left, right = tree
+    nodes = [None] * len(start)
+    # 子节点总是在父节点之后生成，逆序即可自底向上构建
+    for node in range(len(start) - 1, -1, -1):
+        if left[node] < 0:
+            nodes[node] = Tile().add_children(
+                [tiles[i] for i in order[start[node]:end[node]]])
+        else:
+            nodes[node] = Tile().add_child(nodes[left[node]]).add_child(nodes[right[node]])
+    return nodes[0]
+
+
+def binned_sah_tree(mins, maxs, bins=BINS):
+    centroids = (mins + maxs) / 2
+    # 每个轴各维护一份按质心排序的序列，划分时稳定分区保持有序，无需逐层排序
+    orders = np.stack([np.argsort(centroids[:, axis], kind="stable") for axis in range(3)])
+    # 包围盒只用于估算代价，float32 足够；max 取负后与 min 一起做一次 minimum 归约
+    bounds = np.concatenate([mins, -maxs], axis=1).astype(np.float32)
+    start, end, left, right = __build_tree(
+        len(mins),
+        lambda starts, ends: __binned_split(orders, bounds, centroids, starts, ends, bins))
+    return orders[0], start, end, left, right
+
+
+def morton_tree(mins, maxs):
+    codes = morton_codes((mins + maxs) / 2)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    start, end, left, right = __build_tree(
+        len(order), lambda starts, ends: __morton_split(sorted_codes, starts, ends))
+    return order, start, end, left, right
+
+
+def morton_codes(points, bits=MORTON_BITS):
+    low = points.min(axis=0) if len(points) else np.zeros(3)
+    extent = points.max(axis=0) - low if len(points) else np.ones(3)
+    scale = np.where(extent > 0, ((1 << bits) - 1) / np.where(extent > 0, extent, 1), 0)
+    cells = ((points - low) * scale).astype(np.uint64)
+    return (__spread_bits(cells[:, 0]) << np.uint64(2)) | (
+        __spread_bits(cells[:, 1]) << np.uint64(1)) | __spread_bits(cells[:, 2])
+
+
+def __spread_bits(v):
+    # 在每一位之间插入两个 0，10 位 -> 30 位
+    v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+    return v
+
+
+def __build_tree(count, split):
+    # 按层处理：同一层所有待划分节点一次性向量化计算
+    capacity = max(2 * count, 1)
+    start = np.zeros(capacity, dtype=np.int64)
+    end = np.zeros(capacity, dtype=np.int64)
+    left = np.full(capacity, -1, dtype=np.int64)
+    right = np.full(capacity, -1, dtype=np.int64)
+    end[0] = count
+    nodes = 1
+    active = np.arange(1 if count >= LEAF_SIZE else 0)
+    while active.size:
+        starts = start[active]
+        ends = end[active]
+        mids = split(starts, ends)
+        lefts = np.arange(nodes, nodes + len(active))
+        rights = lefts + len(active)
+        nodes += 2 * len(active)
+        left[active] = lefts
+        right[active] = rights
+        start[lefts], end[lefts] = starts, mids
+        start[rights], end[rights] = mids, ends
+        children = np.concatenate([lefts, rights])
+        active = children[end[children] - start[children] >= LEAF_SIZE]
+    return start[:nodes], end[:nodes], left[:nodes], right[:nodes]
+
+
+def __segments(starts, ends):
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    seg = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.arange(lengths.sum()) - np.take(offsets, seg) + np.take(starts, seg)
+    return seg, offsets, positions
+
+
+def __binned_split(orders, bounds, centroids, starts, ends, bins):
+    # 小节点用不超过其大小的 bin 数，避免 bin 数组远大于元素个数
+    lengths = ends - starts
+    group_bins = np.minimum(bins, 2 ** np.ceil(np.log2(lengths)).astype(np.int64))
+    mids = np.empty_like(starts)
+    for b in np.unique(group_bins):
+        group = group_bins == b
+        mids[group] = __binned_split_group(
+            orders, bounds, centroids, starts[group], ends[group], int(b))
+    return mids
+
+
+def __binned_split_group(orders, bounds, centroids, starts, ends, bins):
+    count = orders.shape[1]
+    segments = len(starts)
+    lengths = ends - starts
+    seg, offsets, positions = __segments(starts, ends)
+
+    # 序列有序，质心范围直接取首尾元素；只在跨度最大的轴上分 bin
+    c_min = centroids[orders[:, starts].T, np.arange(3)]
+    c_max = centroids[orders[:, ends - 1].T, np.arange(3)]
+    split_axis = np.argmax(c_max - c_min, axis=1)
+    extent = (c_max - c_min)[np.arange(segments), split_axis]
+    scale = np.where(extent > 0, bins / np.where(extent > 0, extent, 1), 0)
+
+    elem_axis = np.take(split_axis, seg)
+    index = np.take(orders, elem_axis * count + positions)
+    c = np.take(centroids, index * 3 + elem_axis)
+    elem_bin = np.minimum(
+        ((c - np.take(c_min[np.arange(segments), split_axis], seg))
+         * np.take(scale, seg)).astype(np.int64), bins - 1)
+    key = seg * bins + elem_bin
+    group_start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    bin_bounds = np.full((segments * bins, 6), np.inf, dtype=np.float32)
+    bin_bounds[key[group_start]] = np.minimum.reduceat(
+        np.take(bounds, index, axis=0), group_start)
+    bin_bounds = bin_bounds.reshape(segments, bins, 6).transpose(2, 0, 1)
+    bin_min = bin_bounds[0:3]
+    bin_max = -bin_bounds[3:6]
+    bin_count = np.bincount(key, minlength=segments * bins).reshape(segments, bins)
+
+    # 前缀/后缀并集
+    left_min = np.minimum.accumulate(bin_min, axis=2)[..., :-1]
+    left_max = np.maximum.accumulate(bin_max, axis=2)[..., :-1]
+    right_min = np.minimum.accumulate(bin_min[..., ::-1], axis=2)[..., ::-1][..., 1:]
+    right_max = np.maximum.accumulate(bin_max[..., ::-1], axis=2)[..., ::-1][..., 1:]
+    left_count = np.cumsum(bin_count, axis=1)[:, :-1]
+    right_count = lengths[:, None] - left_count
+    valid = (left_count > 0) & (right_count > 0)
+    with np.errstate(invalid="ignore"):
+        cost = surface_area(np.moveaxis(left_max - left_min, 0, -1)) * left_count + \
+            surface_area(np.moveaxis(right_max - right_min, 0, -1)) * right_count
+    cost = np.where(valid, cost, np.inf)
+    split_bin = cost.argmin(axis=1)
+
+    # 质心全部落在同一个 bin 时按数量对半分
+    fallback = np.isinf(cost[np.arange(segments), split_bin])
+    rank = np.arange(len(seg)) - np.take(offsets, seg)
+    go_right = np.zeros(count, dtype=bool)
+    go_right[index] = np.where(
+        np.take(fallback, seg),
+        rank >= np.take(lengths // 2, seg),
+        elem_bin > np.take(split_bin, seg))
+
+    # 各轴序列按左右稳定分区，保持轴内有序
+    left_count = np.bincount(
+        seg, weights=~go_right[index], minlength=segments).astype(np.int64)
+    left_base = np.take(np.cumsum(left_count) - left_count, seg)
+    left_start = np.take(starts, seg) - left_base - 1
+    right_start = positions + np.take(left_count, seg) + left_base
+    for axis in range(3):
+        axis_index = np.take(orders[axis], positions)
+        right = np.take(go_right, axis_index)
+        lefts = np.cumsum(~right)
+        orders[axis][np.where(right, right_start - lefts, left_start + lefts)] = axis_index
+    return starts + left_count
+
+
+def __morton_split(codes, starts, ends):
+    first = codes[starts]
+    diff = first ^ codes[ends - 1]
+    bit = np.zeros(len(starts), dtype=np.uint64)
+    for b in range(3 * MORTON_BITS):
+        bit = np.where(diff >> np.uint64(b), np.uint64(b), bit)
+    mids = np.searchsorted(codes, ((first >> bit) + np.uint64(1)) << bit)
+    # 编码相同的节点按数量对半分
+    return np.where(diff == 0, (starts + ends) // 2, mids)
@@ -0,0 +1,64 @@
+from collections import defaultdict
+import numpy as np
+import utils
+from gltf.slicer import get__attributes
+from tileset import tile_transforms
+
+
+def accessor_signature(slicer, index):
+    if index is None:
+        return None
+    accessor = slicer.accessors[index]
+    return accessor.count, accessor.component_type, accessor.type
+
+
+def mesh_signature(slicer, mesh_id):
+    # 廉价的预筛选键：只有签名相同的 mesh 才需要切分并计算摘要
+    return tuple(
+        (accessor_signature(slicer, p.indices),
+         tuple(sorted((k, accessor_signature(slicer, v)) for k, v in get__attributes(p).items())))
+        for p in slicer.meshes[mesh_id].primitives)
+
+
+def mesh_digest(slicer, mesh_id):
+    # 对切分后的 glb 求摘要，覆盖 buffer 字节、accessor 与材质 json
+    segments = slicer.slice_mesh(mesh_id).segments()
+    return utils.segments_digest(segments), utils.segments_len(segments)
+
+
+def group_matrices(slicer, group):
+    """组内各 mesh 的实例矩阵，合并的组输出为 i3dm
+
+    原本单实例的 mesh 不合并时是带 transform 的 b3dm，预先做同样的 z-up 换算，实例位置与不合并时一致
+    """
+    matrices = [slicer.get_matrices(id) for id in group]
+    if len(group) == 1:
+        return matrices[0]
+    return np.concatenate([tile_transforms(rows) if len(rows) == 1 else rows for rows in matrices])
+
+
+def dedup_meshes(slicer):
+    """把几何与材质完全相同的 mesh 归为一组，返回 (按首个 mesh id 排序的分组, 节省的字节数)"""
+    candidates = defaultdict(list)
+    for mesh_id in range(slicer.meshes_count):
+        candidates[mesh_signature(slicer, mesh_id)].append(mesh_id)
+
+    groups = []
+    saved = 0
+    for ids in candidates.values():
+        if len(ids) == 1:
+            groups.append(ids)
+            continue
+
+        digests = {}
+        for mesh_id in ids:
+            digest, size = mesh_digest(slicer, mesh_id)
+            if digest in digests:
+                digests[digest].append(mesh_id)
+                saved += size
+            else:
+                digests[digest] = [mesh_id]
+        groups += digests.values()
+
+    groups.sort(key=lambda group: group[0])
+    return groups, saved
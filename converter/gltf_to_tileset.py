@@ -1,110 +1,143 @@
-import json
-import numpy as np
-import math
 from gltf.gltf import Axis, Gltf
-from tileset import Tile, Tileset, Measure
+from tileset import Tile, Tileset, Measure, Format, I3dm
 from pathlib import Path
 from gltf import Slicer, io
-from utils import Box3, Matrix4
-
-
-def build_bvh(tiles):
-    split = -1
-    min_cost = math.inf
-    split_axis = -1
-
-    if len(tiles) < 3:
-        return Tile().add_children(tiles)
-
-    for axis in range(3):
-        sorted_tiles = sorted(
-            tiles, key=lambda tile: tile.centroid_world[axis])
-        left_box = Box3()
-        right_box = Box3()
-        left_cost = [0] * (len(sorted_tiles) - 1)
-        right_cost = [0] * (len(sorted_tiles) - 1)
-        for i in range(len(sorted_tiles)-1):
-            left_box.union(sorted_tiles[i].box_world)
-            right_box.union(sorted_tiles[-i-1].box_world)
-            left_cost[i] = sah_cost(left_box.size, i + 1)
-            right_cost[-i-1] = sah_cost(right_box.size, i + 1)
-        costs = list(
-            map(lambda l, r: l + r, left_cost, right_cost))
-        min_cost_axis = min(costs)
-        if min_cost_axis < min_cost:
-            min_cost = min_cost_axis
-            split = np.argmin(costs) + 1
-            split_axis = axis
-
-    sorted_tiles = sorted(
-        tiles, key=lambda tile: tile.centroid_world[split_axis])
-    return Tile().add_child(build_bvh(sorted_tiles[:split])).add_child(build_bvh(sorted_tiles[split:]))
-
-
-def sah_cost(size, count):
-    return (size[0] * size[1] + size[1] * size[2] + size[2] * size[0]) * count
-
-
-def split_group(source):
-    tiles = source[:]
-    length = len(tiles)
-    if 1 == length:
-        return [tiles[0]]
-
-    if 2 == length:
-        return [Tile().add_child(tiles.pop()).add_child(tiles.pop())]
-
-    groups = []
-    while tiles:
-        box = tiles[-1].box_world
-        group = []
-        rest = []
-        for tile in tiles:
-            if box.contains(tile.box_world):
-                group.append(tile)
-            else:
-                rest.append(tile)
-        # group = list(filter(lambda tile: box.contains(tile.box_world), tiles))
-        tile = Tile().add_child(group.pop())
-        if group:
-            tile.add_children(split_group(group))
-
-        groups.append(tile)
-        tiles = rest
-
-    return groups
-
-
-def gltf_to_tileset(fin, fout, measure: Measure = Measure.METER, up_direction: Axis = Axis.Y):
+from utils import Matrix4
+from utils.profiler import Profiler
+from .writer import write_contents, write_tilesets, write_subtrees
+from .bvh import Bvh, build
+from .group import split_group
+from .dedup import dedup_meshes, group_matrices
+from .batch import batch_meshes, batch_tile
+from .split import split_meshes
+from .implicit import implicit_tileset
+from .lod import build_lods
+from .sidecar import Sidecars, remove_sidecars
+from . import manifest as mf
+
+
+def concat(lists):
+    return lists[0] if len(lists) == 1 else [item for items in lists for item in items]
+
+
+def explicit_tiles(gltf_slicer, groups, batch_bytes, batch_vertices, split_triangles, split_bytes):
+    # 超出预算的大 mesh 按三角形八叉树切成多个内容，可分区域加载与剔除
+    parts, groups = split_meshes(gltf_slicer, groups, split_triangles, split_bytes)
+    if parts:
+        print('split:', len(set(tile.part[0] for tile in parts)), 'meshes split into', len(parts), 'contents')
+    # 空间上相邻的小 mesh 合并为一个带 _BATCHID 的 b3dm
+    batches, groups = batch_meshes(gltf_slicer, groups, batch_bytes, batch_vertices)
+    if batches:
+        print('batch:', sum(map(len, batches)), 'meshes merged into', len(batches), 'b3dm')
+    return list(map(
+        lambda group: Tile(
+            content_id=group[0],
+            instance_box=gltf_slicer.get_bounding_box(group[0]),
+            instances_matrices=group_matrices(gltf_slicer, group),
+            matrix=Matrix4(),
+            extras=concat([gltf_slicer.get_extras(id) for id in group])
+        ),
+        groups
+    )) + [batch_tile(gltf_slicer, batch) for batch in batches] + parts
+
+
+def gltf_to_tileset(fin, fout, measure: Measure = Measure.METER, up_direction: Axis = Axis.Y, workers: int = 1,
+                    bvh: Bvh = Bvh.SAH, compact: bool = False, dedup: bool = False,
+                    incremental: bool = True, batch_bytes: int = 0, batch_vertices: int = 0,
+                    quantize_instances: bool = False, external_depth: int = 0, external_nodes: int = 0,
+                    implicit: bool = False, subtree_levels: int = 4, split_triangles: int = 0, split_bytes: int = 0,
+                    lod: bool = False, lod_resolution: int = 32, quantize: bool = False,
+                    gzip: bool = False, gzip_min_bytes: int = 1024, gzip_threads: int = 4,
+                    content_format: Format = Format.B3DM, profiler: Profiler = None):
+    # 未指定时为不记录任何内容的 Profiler
+    profiler = profiler or Profiler()
     Gltf.up_direction = up_direction
-    gltf, buffers = io.read_gltf(fin)
+    Tile.format = content_format
+    I3dm.quantized = quantize_instances
+    Slicer.quantized = quantize
+    with profiler.stage("read_gltf"):
+        gltf, buffers = io.read_gltf(fin, compact)
     Path(fout).parent.mkdir(parents=True, exist_ok=True)
-    gltf_slicer = Slicer(gltf, buffers=buffers)
+    with profiler.stage("slicer"):
+        gltf_slicer = Slicer(gltf, buffers=buffers)
     Tile.measure = measure
-    tiles = list(map(
-        lambda id: Tile(
-            content_id=id,
-            instance_box=gltf_slicer.get_bounding_box(id),
-            instances_matrices=gltf_slicer.get_matrices(id),
-            matrix=Matrix4(),
-            gltf=gltf_slicer.slice_mesh(id).as_bytes(),
-            extras=gltf_slicer.get_extras(id)
-        ),
-        range(gltf_slicer.meshes_count)
-    ))
     print('meshes count:', gltf_slicer.meshes_count)
-
-    # 生成 tileset.json
-    tiles.sort(key=lambda tile: tile.box_world.diagonal) # 按对角线长度排序
-    grouped_tiles = split_group(tiles)
-    root = build_bvh(grouped_tiles)
-    root.refine = "ADD"
-    tileset = Tileset(root)
-    with open(fout, "w") as f:
-        json.dump(tileset.dict, f, separators=(",", ":"))
-
-    for tile in tiles:
-        with open(Path(fout).parent / tile.content.uri, "wb") as f:
-            f.write(tile.content.as_bytes())
-
-    io.copy_textures(fin, fout, gltf.images)
+    profiler.count("meshes", gltf_slicer.meshes_count)
+    profiler.count("input_bytes", sum(len(buffer) for buffer in gltf_slicer.buffers))
+    if dedup:
+        # 相同的 mesh 合并为一个内容，实例矩阵合并后输出 i3dm
+        with profiler.stage("dedup"):
+            groups, saved = dedup_meshes(gltf_slicer)
+        print('dedup:', gltf_slicer.meshes_count - len(groups), 'meshes merged,', saved, 'bytes saved')
+    else:
+        groups = [[id] for id in range(gltf_slicer.meshes_count)]
+    if implicit:
+        # 隐式八叉树：同一格子里的实例合批为一个 b3dm，tile 树由 .subtree 的可用性位流给出
+        with profiler.stage("implicit_tileset"):
+            tileset, tiles, subtrees = implicit_tileset(gltf_slicer, groups, subtree_levels)
+        print('implicit tiling:', len(tiles), 'contents,', len(subtrees), 'subtrees')
+        tilesets = [(Path(fout).name, tileset)]
+    else:
+        with profiler.stage("explicit_tiles"):
+            tiles = explicit_tiles(gltf_slicer, groups, batch_bytes, batch_vertices, split_triangles, split_bytes)
+        # 生成 tileset.json
+        with profiler.stage("split_group"):
+            tiles.sort(key=lambda tile: tile.box_world.diagonal) # 按对角线长度排序
+            grouped_tiles = split_group(tiles)
+        with profiler.stage("build_bvh"):
+            root = build(grouped_tiles, bvh)
+        if lod:
+            # 内部节点挂上顶点聚类得到的代理几何，远处先显示粗模，近处再替换为子节点
+            with profiler.stage("lod"):
+                root, proxies = build_lods(gltf_slicer, root, lod_resolution)
+            print('lod:', len(proxies), 'proxy contents')
+            tiles += proxies
+        if root.refine is None:
+            root.refine = "ADD"
+        # 大的 tile 树切成多个外部 tileset，客户端只需先加载主 tileset
+        with profiler.stage("tileset_dict"):
+            tilesets = Tileset(root).split(Path(fout).name, external_depth, external_nodes)
+        if len(tilesets) > 1:
+            print('external tilesets:', len(tilesets) - 1)
+        subtrees = {}
+    profiler.count("tiles", len(tiles))
+    parent = Path(fout).parent
+    manifest_file = mf.manifest_path(fout)
+    manifest = mf.read_manifest(manifest_file)
+    # gzip_static 用的 .gz 在线程池中与切分同时压缩
+    sidecars = Sidecars(gzip_min_bytes, gzip_threads) if gzip else None
+    with profiler.stage("write_tilesets"):
+        tilesets = write_tilesets(tilesets, parent, workers, sidecars) + write_subtrees(subtrees, parent, sidecars)
+    profiler.count("tilesets", len(tilesets))
+    mf.remove_stale(parent, manifest.get("tilesets", []), tilesets)
+
+    # 按 manifest 增量写出：输入未变时直接跳过，否则只切分输入摘要变化的内容，只重写内容摘要变化的文件
+    source = mf.input_digest(fin, gltf_slicer.buffers)
+    options = {"up": up_direction.value, "dedup": dedup, "batch": [batch_bytes, batch_vertices],
+               "quantize_instances": quantize_instances, "implicit": implicit,
+               "split": [split_triangles, split_bytes], "lod": [lod, lod_resolution], "bvh": bvh.value,
+               "quantize": quantize,
+               "gzip": [gzip, gzip_min_bytes], "format": content_format.value}
+    old_contents = mf.reusable_contents(manifest, options)
+    if incremental and mf.is_unchanged(manifest, source, options, parent):
+        print('input unchanged, contents kept')
+        contents = old_contents
+    else:
+        manifest_file.unlink(missing_ok=True)
+        with profiler.stage("write_contents"):
+            contents = write_contents(tiles, gltf_slicer, parent, fin=fin, compact=compact, workers=workers,
+                                      manifest=old_contents if incremental else None, sidecars=sidecars,
+                                      profiler=profiler)
+        mf.remove_stale(parent, old_contents, contents)
+    if sidecars is None:
+        # 之前开启过 gzip 时，跳过或内容未变的文件还留着旧的 .gz
+        remove_sidecars(parent, contents)
+    else:
+        with profiler.stage("gzip"):
+            stats = sidecars.close()
+        profiler.count("gzip_bytes", stats[3])
+        print('gzip:', sidecars.report())
+    mf.write_manifest(manifest_file, source, options, contents, tilesets[1:])
+
+    with profiler.stage("copy_textures"):
+        io.copy_textures(fin, fout, gltf.images)
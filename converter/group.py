@@ -0,0 +1,58 @@
+import numpy as np
+from tileset import Tile
+from utils import BoxArray
+
+
+def split_group(source):
+    return ContainmentIndex(source).split(np.arange(len(source)))
+
+
+class ContainmentIndex:
+    # 按包围盒最小值排序的扫描索引：包含于 box 的 tile 其最小值必落在 box 在扫描轴上的区间内
+    def __init__(self, tiles) -> None:
+        self.tiles = tiles
+        self.boxes = BoxArray.from_boxes(tile.box_world for tile in tiles)
+        self.mins = self.boxes.min
+        self.maxs = self.boxes.max
+        self.axis = int(np.argmax(np.ptp(self.mins, axis=0))) if len(tiles) else 0
+        self.order = np.argsort(self.mins[:, self.axis], kind="stable")
+        self.keys = self.mins[self.order, self.axis]
+        self.alive = np.ones(len(tiles), dtype=bool)
+
+    def contained(self, index):
+        lo = np.searchsorted(self.keys, self.mins[index, self.axis], "left")
+        hi = np.searchsorted(self.keys, self.maxs[index, self.axis], "right")
+        candidates = self.order[lo:hi]
+        candidates = candidates[self.alive[candidates]]
+        inside = self.boxes[index].contains(self.boxes[candidates])
+        return np.sort(candidates[inside])
+
+    def split(self, members):
+        # members 按原列表顺序排列且均未分组，返回后全部标记为已分组
+        if 1 == len(members):
+            self.alive[members] = False
+            return [self.tiles[members[0]]]
+
+        if 2 == len(members):
+            self.alive[members] = False
+            return [Tile().add_child(self.tiles[members[1]]).add_child(self.tiles[members[0]])]
+
+        groups = []
+        cursor = len(members) - 1
+        while True:
+            while cursor >= 0 and not self.alive[members[cursor]]:
+                cursor -= 1
+            if cursor < 0:
+                break
+
+            last = members[cursor]
+            # 已分组的 tile 不会被 box 包含于当前成员之外的 tile 中，全局索引即可
+            group = self.contained(last)
+            self.alive[last] = False
+            tile = Tile().add_child(self.tiles[last])
+            if len(group) > 1:
+                tile.add_children(self.split(group[:-1]))
+
+            groups.append(tile)
+
+        return groups
@@ -0,0 +1,152 @@
+import numpy as np
+from tileset import Tile, Tileset, Subtree, content_matrices
+from utils import BoxArray, Matrix4
+
+CONTENT_NAME = "{level}_{x}_{y}_{z}"
+SUBTREE_URI = "{level}_{x}_{y}_{z}.subtree"
+# 格子坐标打包为 int64 时每轴 21 位
+MAX_LEVEL = 20
+
+
+def instances(slicer, groups):
+    """把各组 mesh 展开为实例，返回 (mesh id, 世界矩阵, 是否按 i3dm 放置, 内容在 tileset 坐标系中的包围盒, extras)
+
+    同组的 mesh 几何相同，实例都引用组内第一个 mesh；放置方式与显式 tile 一致：
+    多实例的 mesh 按 i3dm 实例放置，单实例的 mesh 即使合并进 i3dm 也按 transform 换算
+    """
+    ids, matrices, instanced, mins, maxs, extras = [], [], [], [], [], []
+    for group in groups:
+        box = slicer.get_bounding_box(group[0])
+        for id in group:
+            id_matrices = slicer.get_matrices(id)
+            count = len(id_matrices)
+            ids += [group[0]] * count
+            matrices.append(id_matrices)
+            instanced += [1 < count] * count
+            mins += [box.min] * count
+            maxs += [box.max] * count
+            extras += slicer.get_extras(id) or [None] * count
+    matrices = np.concatenate(matrices)
+    instanced = np.array(instanced)
+    boxes = BoxArray(mins, maxs).apply_matrix4(content_matrices(matrices, instanced))
+    return ids, matrices, instanced, boxes, extras
+
+
+def assign_cells(boxes, root, max_level=MAX_LEVEL):
+    """每个包围盒能完整放入的最深一级八叉树格子，返回 (level, 格子坐标)"""
+    size = np.where(root.size > 0, root.size, 1)
+    lo = (boxes.min - root.min) / size
+    hi = (boxes.max - root.min) / size
+    levels = np.zeros(len(boxes), dtype=np.int64)
+    cells = np.zeros((len(boxes), 3), dtype=np.int64)
+    for level in range(1, max_level + 1):
+        n = 1 << level
+        first = np.clip(np.floor(lo * n), 0, n - 1).astype(np.int64)
+        last = np.clip(np.ceil(hi * n) - 1, 0, n - 1).astype(np.int64)
+        # 上一级放不下的，更深的格子更小，也放不下
+        fits = (last <= first).all(axis=1) & (levels == level - 1)
+        if not fits.any():
+            break
+        levels[fits] = level
+        cells[fits] = first[fits]
+    return levels, cells
+
+
+def pack(cells):
+    return cells[:, 0] | cells[:, 1] << 21 | cells[:, 2] << 42
+
+
+def morton_index(cells, bits):
+    # 八叉树的 Morton 序：x 在最低位，依次为 y, z
+    index = np.zeros(len(cells), dtype=np.int64)
+    for i in range(bits):
+        for axis in range(3):
+            index |= (cells[:, axis] >> i & 1) << (3 * i + axis)
+    return index
+
+
+def level_offset(level):
+    # subtree 中第 level 层之前的 tile 数
+    return ((1 << 3 * level) - 1) // 7
+
+
+def build_subtrees(levels, cells, subtree_levels):
+    """按 subtree 划分可用性：有内容的格子及其所有祖先为可用 tile"""
+    available_levels = int(levels.max()) + 1
+    available = [None] * available_levels
+    content = [None] * available_levels
+    below = np.empty((0, 3), dtype=np.int64)
+    for level in reversed(range(available_levels)):
+        content[level] = np.unique(cells[levels == level], axis=0)
+        below = np.unique(np.concatenate([content[level], below >> 1]), axis=0)
+        available[level] = below
+
+    subtrees = {}
+    tile_bits = level_offset(subtree_levels)
+    for root_level in range(0, available_levels, subtree_levels):
+        roots = available[root_level]
+        order = np.argsort(pack(roots))
+        keys = pack(roots)[order]
+        tile_availability = np.zeros((len(roots), tile_bits), dtype=bool)
+        content_availability = np.zeros((len(roots), tile_bits), dtype=bool)
+        child_availability = np.zeros((len(roots), 1 << 3 * subtree_levels), dtype=bool)
+
+        def mark(bits, level_cells, depth, offset):
+            root_index = order[np.searchsorted(keys, pack(level_cells >> depth))]
+            local = level_cells & ((1 << depth) - 1)
+            bits[root_index, offset + morton_index(local, depth)] = True
+
+        for depth in range(min(subtree_levels, available_levels - root_level)):
+            mark(tile_availability, available[root_level + depth], depth, level_offset(depth))
+            mark(content_availability, content[root_level + depth], depth, level_offset(depth))
+        if root_level + subtree_levels < available_levels:
+            mark(child_availability, available[root_level + subtree_levels], subtree_levels, 0)
+
+        for i, (x, y, z) in enumerate(roots.tolist()):
+            uri = SUBTREE_URI.format(level=root_level, x=x, y=y, z=z)
+            subtrees[uri] = Subtree(tile_availability[i], content_availability[i], child_availability[i])
+
+    return available_levels, subtrees
+
+
+def implicit_tileset(slicer, groups, subtree_levels=4):
+    """3D Tiles 1.1 隐式八叉树：每个实例放入能容纳它的最深格子，同一格子的实例合批为一个 b3dm
+
+    返回 (tileset dict, 内容 tile, {uri: Subtree})
+    """
+    ids, matrices, instanced, boxes, extras = instances(slicer, groups)
+    root_box = boxes.bounds()
+    levels, cells = assign_cells(boxes, BoxArray(root_box.min, root_box.max))
+
+    tiles = []
+    order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0], levels))
+    keys = np.column_stack([levels, cells])[order]
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+    for members, (level, x, y, z) in zip(np.split(order, starts[1:]), keys[starts].tolist()):
+        rows = [extras[i] for i in members]
+        tiles.append(Tile(
+            content_id=f"{level}_{x}_{y}_{z}",
+            instances_matrices=np.empty((0, 4, 4)),
+            extras=rows if any(row is not None for row in rows) else None,
+            batch=[ids[i] for i in members],
+            batch_matrices=[Matrix4(matrices[i]) for i in members],
+            batch_instanced=instanced[members].tolist()
+        ))
+
+    available_levels, subtrees = build_subtrees(levels, cells, subtree_levels)
+    geometric_error = Tile.to_meter(root_box.diagonal)
+    root = {
+        "boundingVolume": {"box": root_box.list},
+        "geometricError": geometric_error,
+        "refine": "ADD",
+        "content": {"uri": f"{CONTENT_NAME}.{Tile.format.value}"},
+        "implicitTiling": {
+            "subdivisionScheme": "OCTREE",
+            "subtreeLevels": subtree_levels,
+            "availableLevels": available_levels,
+            "subtrees": {"uri": SUBTREE_URI}
+        }
+    }
+    tileset = Tileset.as_dict(root)
+    tileset["asset"] = {**Tileset.ASSET, "version": "1.1"}
+    return tileset, tiles, subtrees
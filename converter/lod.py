@@ -0,0 +1,146 @@
+import math
+import numpy as np
+from gltf.slicer import get__attributes
+from tileset import Tile, content_matrices
+from tileset.tile import Y_UP_TO_Z_UP
+from .implicit import pack
+
+# 代理几何包围盒最长边上的聚类格子数
+RESOLUTION = 32
+# 运行时坐标 -> glTF 坐标：代理内容没有 transform，只经过 y-up -> z-up 旋转
+Z_UP_TO_Y_UP = np.linalg.inv(Y_UP_TO_Z_UP)
+
+
+def mesh_geometry(slicer, mesh_id, selection=None):
+    """mesh 的 (顶点, 三角形, 各三角形的材质序号)，selection 为各 primitive 中选取的三角形"""
+    # 点、线与无法直接读取顶点的 mesh 不进入代理几何
+    if not slicer.is_splittable(mesh_id):
+        return np.empty((0, 3)), np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    positions, triangles, materials = [], [], []
+    offset = 0
+    for index, p in enumerate(slicer.meshes[mesh_id].primitives):
+        values = slicer.accessor_values(get__attributes(p)["POSITION"])
+        primitive_triangles = slicer.triangles(p)
+        if selection is not None:
+            primitive_triangles = primitive_triangles[selection[index]]
+        positions.append(values)
+        triangles.append(primitive_triangles + offset)
+        materials.append(np.full(len(primitive_triangles), -1 if p.material is None else p.material))
+        offset += len(values)
+    return np.concatenate(positions).astype(np.float64), np.concatenate(triangles), np.concatenate(materials)
+
+
+def leaf_matrices(tile):
+    """内容 tile 各实例从 mesh 局部坐标到 glTF 坐标的矩阵，与运行时的显示位置一致"""
+    if tile.batch:
+        return np.array([np.array(node).reshape(4, 4, order="F") for node in tile.batch_node_matrices])
+
+    if tile.instanced:
+        # i3dm 的实例矩阵不做 z-up 换算：instance * R * up
+        return tile.gltf_instance_matrices
+    # 单实例的 b3dm：transform * R * up
+    return Z_UP_TO_Y_UP @ content_matrices(tile.instances_matrices)
+
+
+def leaf_geometry(slicer, tile):
+    """内容 tile 展开实例后的几何，坐标为 glTF 坐标"""
+    matrices = leaf_matrices(tile)
+    if tile.batch:
+        return concat_geometry([transform(mesh_geometry(slicer, id), matrix[None])
+                                for id, matrix in zip(tile.batch, matrices)])
+    if tile.part:
+        return transform(mesh_geometry(slicer, *tile.part), matrices)
+    return transform(mesh_geometry(slicer, tile.content_id), matrices)
+
+
+def transform(geometry, matrices):
+    """几何按 (N,4,4) 的各实例矩阵展开"""
+    positions, triangles, materials = geometry
+    count = len(matrices)
+    positions = positions @ matrices[:, 0:3, 0:3].transpose(0, 2, 1) + matrices[:, None, 0:3, 3]
+    triangles = triangles + (np.arange(count) * len(geometry[0]))[:, None, None]
+    return positions.reshape(-1, 3), triangles.reshape(-1, 3), np.tile(materials, count)
+
+
+def concat_geometry(geometries):
+    offsets = np.cumsum([0] + [len(positions) for positions, _, _ in geometries])
+    return (np.concatenate([positions for positions, _, _ in geometries]).reshape(-1, 3),
+            np.concatenate([triangles + offset for (_, triangles, _), offset in zip(geometries, offsets)]).reshape(-1, 3),
+            np.concatenate([materials for _, _, materials in geometries]))
+
+
+def cluster(positions, triangles, materials, resolution=RESOLUTION):
+    """顶点聚类简化：同一格子里的顶点合并为均值，退化与重复的三角形去掉
+
+    返回 (简化后的几何, 格子边长)
+    """
+    low = positions.min(axis=0)
+    cell = np.ptp(positions, axis=0).max() / resolution
+    if cell == 0:
+        return (positions[:0], triangles[:0], materials[:0]), 0.
+    cells = np.clip(np.floor((positions - low) / cell), 0, resolution - 1).astype(np.int64)
+    _, inverse = np.unique(pack(cells), return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse)
+    centers = np.stack([np.bincount(inverse, weights=positions[:, axis]) for axis in range(3)], axis=1)
+    centers /= counts[:, None]
+
+    triangles = inverse[triangles]
+    kept = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (
+        triangles[:, 2] != triangles[:, 0])
+    triangles, materials = triangles[kept], materials[kept]
+    # 轮换到最小顶点在前，保持绕向，同一材质的相同三角形只留一个
+    first = np.argmin(triangles, axis=1)
+    triangles = np.take_along_axis(triangles, (first[:, None] + np.arange(3)) % 3, axis=1)
+    rows = np.unique(np.column_stack([materials, triangles]), axis=0)
+    materials, triangles = rows[:, 0], rows[:, 1:]
+
+    vertices, triangles = np.unique(triangles.reshape(-1), return_inverse=True)
+    return (centers[vertices], triangles.reshape(-1, 3), materials), cell
+
+
+def build_lods(slicer, root, resolution=RESOLUTION):
+    """自底向上重建 tile 树并为内部节点生成代理几何：子节点的代理（或叶子内容）再做一次顶点聚类
+
+    只有一个子节点的空 tile 直接由子节点代替；有代理的节点细化方式为 REPLACE，
+    几何误差为聚类格子的对角线长，且不小于子节点的几何误差。返回 (新的根节点, 带代理内容的 tile)
+    """
+    proxies = []
+    # 已重建的子树：(tile, 几何)
+    built = {}
+    stack = [(root, False)]
+    while stack:
+        tile, visited = stack.pop()
+        if not tile.children:
+            built[id(tile)] = (tile, None)
+            continue
+        if not visited:
+            stack.append((tile, True))
+            stack.extend((child, False) for child in tile.children)
+            continue
+
+        children = [built.pop(id(child)) for child in tile.children]
+        if len(children) == 1:
+            built[id(tile)] = children[0]
+            continue
+
+        geometry = concat_geometry([
+            leaf_geometry(slicer, child) if geometry is None else geometry for child, geometry in children])
+        node = Tile().add_children([child for child, _ in children])
+        if len(geometry[1]):
+            geometry, cell = cluster(*geometry, resolution)
+        built[id(tile)] = (node, geometry)
+        positions, triangles, materials = geometry
+        if not len(triangles):
+            continue
+
+        # 顶点相对包围盒中心存为 float32，中心放到节点的平移上
+        center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+        lod = (center.tolist(), (positions - center).astype("<f4"), triangles, materials)
+        # 几何误差不小于任何子节点的：子节点代理再聚类后范围可能略小，叶子内容的误差取自其包围盒
+        geometric_error = max([Tile.to_meter(cell * math.sqrt(3))] + [
+            child.geometric_error for child, _ in children])
+        node.set_lod(f"lod_{len(proxies)}", lod, geometric_error)
+        proxies.append(node)
+    return built[id(root)][0], proxies
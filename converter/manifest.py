@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 2: contents 的值为 [内容摘要, 输入摘要]
+MANIFEST_VERSION = 2
+
+
+def manifest_path(fout):
+    # tileset.json -> tileset.manifest.json
+    return Path(fout).with_suffix(".manifest.json")
+
+
+def input_digest(fin, buffers):
+    digest = hashlib.sha1()
+    # 分块读入，glb 输入不必整个载入内存
+    with open(fin, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    for buffer in buffers:
+        digest.update(buffer)
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def write_manifest(path, source, options, contents, tilesets=()):
+    with open(path, "w") as f:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            "input": source,
+            "options": options,
+            "contents": contents,
+            "tilesets": list(tilesets)
+        }, f, separators=(",", ":"), sort_keys=True)
+
+
+def is_unchanged(manifest, source, options, parent):
+    # 输入与影响内容的选项都没变，且内容文件都还在，则无需重新切分
+    if manifest.get("input") != source or manifest.get("options") != options:
+        return False
+    return all((parent / uri).exists() for uri in manifest.get("contents", {}))
+
+
+def reusable_contents(manifest, options):
+    """旧 manifest 中的 {uri: [内容摘要, 输入摘要]}；选项变化时输入摘要不再可信，只按内容摘要跳过写入"""
+    contents = manifest.get("contents", {})
+    if manifest.get("options") == options:
+        return contents
+    return {uri: [digest, None] for uri, (digest, _) in contents.items()}
+
+
+def remove_stale(parent, old_contents, contents):
+    # 同样用于清理不再输出的外部 tileset，连同 .gz 旁路文件
+    for uri in old_contents:
+        if uri in contents:
+            continue
+        try:
+            (parent / uri).unlink(missing_ok=True)
+            (parent / (uri + ".gz")).unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(e)
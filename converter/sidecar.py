@@ -0,0 +1,97 @@
+import threading
+import timeit
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 小于该字节数的文件不压缩
+MIN_BYTES = 1024
+# 压缩后仍大于原文件该比例的不保留 .gz
+MAX_RATIO = 0.9
+# 每个压缩线程最多排队的文件数，排队的内容占着内存
+QUEUE_PER_THREAD = 4
+
+
+def sidecar_path(path):
+    return Path(str(path) + ".gz")
+
+
+def compress(path, segments, min_bytes=MIN_BYTES, level=6):
+    """把分段的文件内容压缩为 gzip 旁路文件 (供 gzip_static 使用)，返回统计 [文件数, 跳过数, 原字节数, 压缩字节数, 耗时]"""
+    start = timeit.default_timer()
+    size = sum(len(segment) for segment in segments)
+    gz = sidecar_path(path)
+    data = None
+    if size >= min_bytes:
+        # wbits=31 输出 gzip 格式，头部不含时间戳，内容不变时 .gz 也不变
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        data = [compressor.compress(segment) for segment in segments]
+        data.append(compressor.flush())
+        if sum(map(len, data)) > size * MAX_RATIO:
+            data = None
+    if data is None:
+        # 旧的 .gz 与新内容不一致，须删除
+        gz.unlink(missing_ok=True)
+        return [1, 1, size, size, timeit.default_timer() - start]
+    with open(gz, "wb") as f:
+        f.writelines(data)
+    return [1, 0, size, sum(map(len, data)), timeit.default_timer() - start]
+
+
+def update_sidecar(sidecars, path, segments):
+    """文件重写后更新 .gz；不压缩时删除旧的，以免静态服务器返回过期内容"""
+    if sidecars is None:
+        sidecar_path(path).unlink(missing_ok=True)
+    else:
+        sidecars.submit(path, segments)
+
+
+def remove_sidecars(parent, uris):
+    """删除各文件的 .gz：不压缩时旧的 .gz 不再随文件更新，未重写的文件也须删除"""
+    for uri in uris:
+        sidecar_path(parent / uri).unlink(missing_ok=True)
+
+
+class Sidecars:
+    """在线程池中压缩写出的文件，与切分、编码并行；zlib 压缩时释放 GIL
+
+    threads 为 0 时在调用线程中直接压缩（用于子进程）
+    """
+
+    def __init__(self, min_bytes=MIN_BYTES, threads=0):
+        self.min_bytes = min_bytes
+        self.__stats = [0, 0, 0, 0, 0.]
+        self.__futures = []
+        self.__executor = ThreadPoolExecutor(threads) if threads else None
+        self.__queue = threading.BoundedSemaphore(threads * QUEUE_PER_THREAD) if threads else None
+
+    def submit(self, path, segments):
+        if self.__executor is None:
+            self.add(compress(path, segments, self.min_bytes))
+            return
+        # 排队已满时等待，内存占用不随文件数增长
+        self.__queue.acquire()
+        future = self.__executor.submit(compress, path, segments, self.min_bytes)
+        future.add_done_callback(lambda _: self.__queue.release())
+        self.__futures.append(future)
+
+    def add(self, stats):
+        self.__stats = [a + b for a, b in zip(self.__stats, stats)]
+
+    def take(self):
+        """取出并清零已完成的统计，子进程按任务返回给主进程"""
+        stats, self.__stats = self.__stats, [0, 0, 0, 0, 0.]
+        return stats
+
+    def close(self):
+        if self.__executor is not None:
+            for future in self.__futures:
+                self.add(future.result())
+            self.__futures = []
+            self.__executor.shutdown()
+        return self.__stats
+
+    def report(self):
+        files, skipped, size, compressed, seconds = self.__stats
+        ratio = compressed / size if size else 1
+        return f"{files - skipped} of {files} files, {size} -> {compressed} bytes ({ratio:.1%}), {seconds:.2f}s compressing"
@@ -0,0 +1,98 @@
+import numpy as np
+from tileset import Tile
+from utils import Box3, Matrix4
+from gltf.slicer import get__attributes
+from .dedup import group_matrices
+
+# 三角形重心重合时八叉树无法再分，到此深度停止
+MAX_DEPTH = 16
+
+
+def triangle_bytes(slicer, primitive, count):
+    # 输出中每个三角形大约占用的字节：均摊的顶点属性加上 3 个 32 位索引
+    vertex_bytes = sum(slicer.accessor_rows(id).nbytes for id in get__attributes(primitive).values())
+    return vertex_bytes / max(count, 1) + 3 * 4
+
+
+def octree_cells(points, fits, max_depth=MAX_DEPTH):
+    """按点所在的八叉树格子划分，直到 fits(成员) 成立，返回各格子的成员序号（Morton 序）"""
+    cells = []
+    stack = [(np.arange(len(points)), points.min(axis=0), points.max(axis=0), 0)]
+    while stack:
+        members, low, high, depth = stack.pop()
+        if depth == max_depth or fits(members):
+            cells.append(members)
+            continue
+
+        center = (low + high) / 2
+        octants = (points[members] >= center) @ np.array([1, 2, 4])
+        order = np.argsort(octants, kind="stable")
+        bounds = np.searchsorted(octants[order], np.arange(9))
+        for octant in reversed(range(8)):
+            child = members[order[bounds[octant]:bounds[octant + 1]]]
+            if len(child):
+                upper = np.array([octant & 1, octant & 2, octant & 4], dtype=bool)
+                stack.append((child, np.where(upper, center, low), np.where(upper, high, center), depth + 1))
+    return cells
+
+
+def split_mesh(slicer, mesh_id, max_triangles=0, max_bytes=0):
+    """超出三角形数或字节预算的 mesh 按三角形重心做八叉树划分
+
+    返回各格子的 (各 primitive 中的三角形序号, 局部包围盒)，不需要或不能划分时返回 None
+    """
+    if not (max_triangles or max_bytes) or not slicer.is_splittable(mesh_id):
+        return None
+
+    primitives = slicer.meshes[mesh_id].primitives
+    triangles = [slicer.triangles(p) for p in primitives]
+    weights = np.concatenate([np.full(len(t), triangle_bytes(slicer, p, len(t)))
+                              for p, t in zip(primitives, triangles)])
+
+    def fits(members):
+        return (not max_triangles or len(members) <= max_triangles) and (
+            not max_bytes or weights[members].sum() <= max_bytes)
+
+    if fits(np.arange(len(weights))):
+        return None
+
+    centroids, lows, highs = [], [], []
+    for p, t in zip(primitives, triangles):
+        corners = slicer.accessor_values(get__attributes(p)["POSITION"])[t]
+        centroids.append(corners.mean(axis=1, dtype=np.float64))
+        lows.append(corners.min(axis=1))
+        highs.append(corners.max(axis=1))
+    centroids, lows, highs = np.concatenate(centroids), np.concatenate(lows), np.concatenate(highs)
+
+    starts = np.concatenate([[0], np.cumsum([len(t) for t in triangles])])
+    parts = []
+    for members in octree_cells(centroids, fits):
+        members = np.sort(members)
+        bounds = np.searchsorted(members, starts)
+        selection = [members[bounds[i]:bounds[i + 1]] - starts[i] for i in range(len(primitives))]
+        box = Box3(lows[members].min(axis=0).tolist(), highs[members].max(axis=0).tolist())
+        parts.append((selection, box))
+    return parts
+
+
+def split_meshes(slicer, groups, max_triangles=0, max_bytes=0):
+    """大 mesh 切成多个内容 tile，返回 (切分得到的 tile, 未切分的分组)"""
+    tiles, remaining = [], []
+    for group in groups:
+        parts = split_mesh(slicer, group[0], max_triangles, max_bytes)
+        if not parts:
+            remaining.append(group)
+            continue
+
+        matrices = group_matrices(slicer, group)
+        extras = [row for id in group for row in slicer.get_extras(id)]
+        for index, (selection, box) in enumerate(parts):
+            tiles.append(Tile(
+                content_id=f"{group[0]}_{index}",
+                instance_box=box,
+                instances_matrices=matrices,
+                matrix=Matrix4(),
+                extras=extras,
+                part=(group[0], selection)
+            ))
+    return tiles, remaining
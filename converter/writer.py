@@ -0,0 +1,213 @@
+import hashlib
+import json
+import multiprocessing
+import timeit
+from multiprocessing import shared_memory
+import numpy as np
+from gltf import Gltf, Slicer, io
+from tileset import I3dm, Tile, Format
+import utils
+from utils.profiler import Records
+from .sidecar import Sidecars, sidecar_path, update_sidecar
+
+# 子进程内的状态，由 _init_worker 创建
+_slicer = None
+_parent = None
+_manifest = None
+_blocks = []
+_tilesets = None
+_sidecars = None
+_records = None
+
+
+def content_meshes(tile):
+    """内容包含的源 mesh id，代理几何为空"""
+    if tile.lod is not None:
+        return []
+    if tile.batch:
+        return list(tile.batch)
+    if tile.part:
+        return [tile.part[0]]
+    return [tile.content_id]
+
+
+def source_digest(tile, gltf_slicer):
+    """内容的输入摘要：源 mesh、切分的三角形、实例与合批矩阵以及 extras；代理几何返回 None，总是重新生成"""
+    if tile.lod is not None:
+        return None
+    digest = hashlib.sha1()
+    for mesh_id in content_meshes(tile):
+        digest.update(gltf_slicer.mesh_digest(mesh_id).encode())
+    if tile.part:
+        for triangles in tile.part[1]:
+            digest.update(np.ascontiguousarray(triangles).tobytes())
+    if tile.batch:
+        digest.update(np.asarray(tile.batch_node_matrices).tobytes())
+    if tile.instances_matrices is not None:
+        digest.update(np.ascontiguousarray(tile.instances_matrices).tobytes())
+    digest.update(json.dumps(tile.extras, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def slice_tile(tile, gltf_slicer):
+    if tile.lod is not None:
+        return gltf_slicer.slice_proxy(*tile.lod)
+    gltf_contents = Tile.format is Format.GLB
+    if tile.batch:
+        return gltf_slicer.slice_batch(tile.batch, tile.batch_node_matrices, feature_ids=gltf_contents)
+    # 多实例的内容在 glb 中用 EXT_mesh_gpu_instancing 输出，b3dm 时由 i3dm 的实例表给出
+    instances = tile.gltf_instance_matrices if gltf_contents and tile.instanced else None
+    if tile.part:
+        return gltf_slicer.slice_triangles(*tile.part, instances)
+    return gltf_slicer.slice_mesh(tile.content_id, instances)
+
+
+def write_content(tile, gltf_slicer, parent, manifest=None, sidecars=None, profiler=None):
+    """写出 tile 的内容文件，返回 (uri, [内容摘要, 输入摘要])
+
+    输入摘要与 manifest 中记录的一致且文件存在时不切分；否则切分编码，内容摘要一致时不重写文件
+    """
+    start = timeit.default_timer()
+    source = source_digest(tile, gltf_slicer)
+    uri = tile.content.uri
+    path = parent / uri
+    old = manifest.get(uri) if manifest else None
+    if old is not None and source is not None and old[1] == source and path.exists():
+        if sidecars is not None and not sidecar_path(path).exists():
+            sidecars.submit(path, [path.read_bytes()])
+        return uri, old
+
+    content = tile.create_content(slice_tile(tile, gltf_slicer))
+    segments = content.segments()
+    digest = utils.segments_digest(segments)
+    if old is None or old[0] != digest or not path.exists():
+        with open(path, "wb") as f:
+            utils.write_segments(f, segments)
+        update_sidecar(sidecars, path, segments)
+    elif sidecars is not None and not sidecar_path(path).exists():
+        sidecars.submit(path, segments)
+    if profiler is not None:
+        profiler.content(uri, content_meshes(tile), timeit.default_timer() - start, utils.segments_len(segments))
+    return uri, [digest, source]
+
+
+def write_contents(tiles, gltf_slicer, parent, *, fin=None, compact=False, workers=1, manifest=None, sidecars=None,
+                   profiler=None):
+    if workers > 1:
+        return _write_contents_parallel(tiles, fin, compact, gltf_slicer.buffers, parent, workers, manifest, sidecars,
+                                        profiler)
+
+    # 逐个切分、编码并写入，写完即释放，内存占用与 mesh 数量无关
+    return dict(write_content(tile, gltf_slicer, parent, manifest, sidecars, profiler) for tile in tiles)
+
+
+def write_tileset(uri, tileset, parent, sidecars=None):
+    data = json.dumps(tileset, separators=(",", ":")).encode()
+    with open(parent / uri, "wb") as f:
+        f.write(data)
+    update_sidecar(sidecars, parent / uri, [data])
+    return uri
+
+
+def write_tilesets(tilesets, parent, workers=1, sidecars=None):
+    """写出 [(文件名, tileset dict)]，返回文件名列表"""
+    if workers > 1 and len(tilesets) > 1:
+        # fork 时 tileset dict 随子进程继承，不必逐个序列化传给子进程
+        with multiprocessing.Pool(
+                min(workers, len(tilesets)), initializer=_init_tileset_worker,
+                initargs=(tilesets, parent, sidecars and sidecars.min_bytes)) as pool:
+            ret = []
+            for uri, stats in pool.imap(_write_tileset, range(len(tilesets))):
+                ret.append(uri)
+                if stats is not None:
+                    sidecars.add(stats)
+            return ret
+
+    return [write_tileset(uri, tileset, parent, sidecars) for uri, tileset in tilesets]
+
+
+def _init_tileset_worker(tilesets, parent, sidecar_bytes):
+    global _tilesets, _parent, _sidecars
+    _tilesets = tilesets
+    _parent = parent
+    _sidecars = None if sidecar_bytes is None else Sidecars(sidecar_bytes)
+
+
+def _write_tileset(index):
+    uri = write_tileset(*_tilesets[index], _parent, _sidecars)
+    return uri, _sidecars and _sidecars.take()
+
+
+def write_subtrees(subtrees, parent, sidecars=None):
+    for uri, subtree in subtrees.items():
+        segments = subtree.segments()
+        with open(parent / uri, "wb") as f:
+            utils.write_segments(f, segments)
+        update_sidecar(sidecars, parent / uri, segments)
+    return list(subtrees)
+
+
+def share_buffers(buffers):
+    # 文件映射的 buffer 由子进程自行映射，其余的（data uri）放入共享内存
+    blocks = {}
+    for index, buffer in enumerate(buffers):
+        if io.is_mapped(buffer):
+            continue
+        block = shared_memory.SharedMemory(create=True, size=max(len(buffer), 1))
+        block.buf[:len(buffer)] = buffer
+        blocks[index] = block
+    return blocks
+
+
+def _init_worker(fin, compact, shared, parent, up_direction, content_format, quantized, mesh_quantized, manifest,
+                 sidecar_bytes, profiled):
+    global _slicer, _parent, _manifest, _sidecars, _records
+    Gltf.up_direction = up_direction
+    Tile.format = content_format
+    I3dm.quantized = quantized
+    Slicer.quantized = mesh_quantized
+    gltf = io.read_json(fin, compact)
+    buffers = []
+    for index, buffer in enumerate(gltf.buffers):
+        if index in shared:
+            name, size = shared[index]
+            _blocks.append(shared_memory.SharedMemory(name=name))
+            buffers.append(_blocks[-1].buf[:size])
+        else:
+            buffers += io.read_buffers(fin, [buffer])
+    delattr(gltf, "buffers")
+    _slicer = Slicer(gltf, buffers=buffers)
+    _parent = parent
+    _manifest = manifest
+    # 子进程内直接压缩，统计随每个任务的结果返回
+    _sidecars = None if sidecar_bytes is None else Sidecars(sidecar_bytes)
+    _records = Records() if profiled else None
+
+
+def _write_tile(tile):
+    uri, digest = write_content(tile, _slicer, _parent, _manifest, _sidecars, _records)
+    return uri, digest, _sidecars and _sidecars.take(), _records and _records.take()
+
+
+def _write_contents_parallel(tiles, fin, compact, buffers, parent, workers, manifest, sidecars=None, profiler=None):
+    # 源 buffer 不随任务序列化：子进程映射同一文件或挂载共享内存
+    blocks = share_buffers(buffers)
+    shared = {index: (block.name, len(buffers[index]))
+              for index, block in blocks.items()}
+    try:
+        with multiprocessing.Pool(
+                workers, initializer=_init_worker,
+                initargs=(fin, compact, shared, parent, Gltf.up_direction, Tile.format, I3dm.quantized, Slicer.quantized,
+                          manifest, sidecars and sidecars.min_bytes, profiler is not None and profiler.enabled)) as pool:
+            contents = {}
+            for uri, digest, stats, records in pool.imap_unordered(_write_tile, tiles, chunksize=16):
+                contents[uri] = digest
+                if stats is not None:
+                    sidecars.add(stats)
+                for record in records or []:
+                    profiler.content(*record)
+            return contents
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
@@ -1,4 +1,5 @@
 from .gltf import Glb, Gltf, Axis
 from .slicer import Slicer
 from .element import Element
+from .document import Document
 from . import io
@@ -0,0 +1,193 @@
+from collections.abc import Sequence
+from .element import Element
+
+
+class Record:
+    # 大量出现的对象用 __slots__ 存储常用字段，其余字段保留原始 JSON，访问时才转换为 Element
+    __slots__ = ("_layout", "_rest")
+    KEYS = {}
+    __layouts = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.ATTRIBUTES = {attribute: key for key, attribute in cls.KEYS.items()}
+
+    def __init__(self, data=None) -> None:
+        self._rest = None
+        if data is None:
+            self._layout = ()
+            return
+
+        keys = tuple(data)
+        # 相同的键顺序共享同一个 tuple
+        self._layout = Record.__layouts.setdefault(keys, keys)
+        for key, value in data.items():
+            attribute = self.KEYS.get(key)
+            if attribute is not None:
+                setattr(self, attribute, self._convert(attribute, value))
+            else:
+                if self._rest is None:
+                    self._rest = {}
+                self._rest[key] = value
+
+    def _convert(self, attribute, value):
+        return value
+
+    def __getattr__(self, name):
+        # 未赋值或不存在的字段返回 None，与 Element 一致
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in self.ATTRIBUTES or self._rest is None:
+            return None
+
+        key = self.__rest_key(name)
+        if key is None:
+            return None
+
+        value = self._rest[key]
+        if type(value) == dict:
+            value = self._rest[key] = Element(**value)
+        elif type(value) == list:
+            value = self._rest[key] = [
+                Element(**item) if type(item) == dict else item for item in value]
+        return value
+
+    def __rest_key(self, name):
+        for key in self._rest:
+            if key == name or key.replace("_", "").lower() == name.replace("_", "").lower():
+                return key
+        return None
+
+    def clone(self):
+        ret = object.__new__(type(self))
+        ret._layout = self._layout
+        ret._rest = dict(self._rest) if self._rest is not None else None
+        for attribute in self.ATTRIBUTES:
+            value = getattr(self, attribute)
+            if value is not None:
+                setattr(ret, attribute, value)
+        return ret
+
+    def as_dict(self, camel_case=True):
+        ret = {}
+        keys = list(self._layout)
+        keys += [key for key, attribute in self.KEYS.items()
+                 if key not in self._layout and getattr(self, attribute) is not None]
+        for key in keys:
+            attribute = self.KEYS.get(key)
+            if attribute is not None:
+                value = getattr(self, attribute)
+                if not camel_case:
+                    key = attribute
+            else:
+                value = self._rest.get(key) if self._rest else None
+
+            if hasattr(value, "as_dict"):
+                ret[key] = value.as_dict(camel_case)
+            elif type(value) == list:
+                if value:
+                    ret[key] = [item.as_dict(camel_case) if hasattr(
+                        item, "as_dict") else item for item in value]
+            elif value is not None:
+                ret[key] = value
+
+        return ret
+
+
+class Node(Record):
+    __slots__ = ("mesh", "children", "matrix", "translation", "rotation", "scale", "extras")
+    KEYS = {"mesh": "mesh", "children": "children", "matrix": "matrix", "translation": "translation",
+            "rotation": "rotation", "scale": "scale", "extras": "extras"}
+
+
+class Accessor(Record):
+    __slots__ = ("buffer_view", "byte_offset", "component_type", "normalized", "count", "type", "min", "max")
+    KEYS = {"bufferView": "buffer_view", "byteOffset": "byte_offset", "componentType": "component_type",
+            "normalized": "normalized", "count": "count", "type": "type", "min": "min", "max": "max"}
+
+
+class BufferView(Record):
+    __slots__ = ("buffer", "byte_offset", "byte_length", "byte_stride", "target")
+    KEYS = {"buffer": "buffer", "byteOffset": "byte_offset", "byteLength": "byte_length",
+            "byteStride": "byte_stride", "target": "target"}
+
+
+class Primitive(Record):
+    __slots__ = ("attributes", "indices", "material", "mode")
+    KEYS = {"attributes": "attributes", "indices": "indices", "material": "material", "mode": "mode"}
+
+
+class Mesh(Record):
+    __slots__ = ("primitives",)
+    KEYS = {"primitives": "primitives"}
+
+    def _convert(self, attribute, value):
+        if attribute == "primitives":
+            return [Primitive(primitive) for primitive in value]
+        return value
+
+
+class LazyList(Sequence):
+    # 材质、纹理等较少访问的对象，第一次访问时才转换为 Element
+    __slots__ = ("__items",)
+
+    def __init__(self, items) -> None:
+        self.__items = items
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        item = self.__items[index]
+        if type(item) == dict:
+            item = self.__items[index] = Element(**item)
+        return item
+
+    def as_dict(self, camel_case=True):
+        return [item.as_dict(camel_case) if hasattr(item, "as_dict") else item for item in self]
+
+
+class Document:
+    RECORDS = {"nodes": Node, "meshes": Mesh, "accessors": Accessor, "bufferViews": BufferView}
+    NAMES = {"nodes": "nodes", "meshes": "meshes", "accessors": "accessors", "bufferViews": "buffer_views",
+             "buffers": "buffers", "materials": "materials", "textures": "textures", "images": "images",
+             "samplers": "samplers", "scenes": "scenes", "scene": "scene", "asset": "asset",
+             "extensionsUsed": "extensions_used", "extensionsRequired": "extensions_required"}
+
+    def __init__(self, data) -> None:
+        for key in data.get("extensionsUsed", []):
+            Element.extensions.add(key)
+        self._keys = {}
+        for key, value in data.items():
+            name = Document.NAMES.get(key, key)
+            record = Document.RECORDS.get(key)
+            if record is not None:
+                value = [record(item) for item in value]
+            elif type(value) == list:
+                value = LazyList(value)
+            elif type(value) == dict:
+                value = Element(**value)
+            self._keys[name] = key
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+    def as_dict(self, camel_case=True):
+        ret = {}
+        for name, key in self._keys.items():
+            if name not in self.__dict__:
+                continue
+            value = self.__dict__[name]
+            if hasattr(value, "as_dict"):
+                value = value.as_dict(camel_case)
+            elif type(value) == list:
+                value = [item.as_dict(camel_case) if hasattr(
+                    item, "as_dict") else item for item in value]
+            ret[key if camel_case else name] = value
+        return ret
@@ -31,6 +31,9 @@ class Element:
         self.__init(camel_case=camel_case, **kwargs)
 
     def __getattr__(self, name):
+        # 让 pickle 等协议按默认行为处理，多进程时需要序列化 Element
+        if name.startswith("__"):
+            raise AttributeError(name)
         return None
 
     def clone(self):
@@ -43,12 +46,12 @@ class Element:
             if camel_case and key not in Element.extensions:
                 key = utils.snake_to_camel(key)
 
-            if type(value) == Element:
+            if hasattr(value, "as_dict"):
                 ret[key] = value.as_dict(camel_case)
             elif type(value) == list:
                 if value:
-                    ret[key] = [item.as_dict(camel_case) if type(
-                        item) == Element else item for item in value]
+                    ret[key] = [item.as_dict(camel_case) if hasattr(
+                        item, "as_dict") else item for item in value]
             elif value is not None:
                 ret[key] = value
 
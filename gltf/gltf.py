@@ -58,6 +58,14 @@ class Glb:
         self.__json = Gltf(**kwargs)
         self.__json.buffers = [Element(byte_length=self.buffer_len)]
 
+    @property
+    def extras(self):
+        return self.__json.extras
+
+    @extras.setter
+    def extras(self, value):
+        self.__json.extras = value
+
     @property
     def buffer_len(self):
         bufferLen = 0
@@ -68,25 +76,32 @@ class Glb:
     def get_buffer(self) -> bytearray:
         ret = bytearray()
         for buffer in self.buffers:
-            ret += buffer.ljust(utils.padded_len(len(buffer)), b"\0")
+            ret += buffer
+            ret += b"\0" * (utils.padded_len(len(buffer)) - len(buffer))
         return ret
 
-    def as_bytes(self) -> bytearray:
-        ret = bytearray()
-        ret += Glb.MAGIC
-        ret += utils.int_to_bytes(Glb.VERSION)
-
+    def segments(self) -> list:
         json_chunk = json.dumps(
             self.__json.as_dict(True), separators=(",", ":")).encode()
         json_len = math.ceil(len(json_chunk) / 4) * 4
-        json_chunk = json_chunk.ljust(json_len, b" ")
-        buffer = self.get_buffer()
-        glb_len = 12 + 8 + json_len + 8 + len(buffer)
-        ret += utils.int_to_bytes(glb_len)
-        ret += utils.int_to_bytes(json_len)
-        ret += Glb.CHUNK_JSON
-        ret += json_chunk
-        ret += utils.int_to_bytes(len(buffer))
-        ret += Glb.CHUNK_BIN
-        ret += buffer
+        buffer_len = self.buffer_len
+        glb_len = 12 + 8 + json_len + 8 + buffer_len
+
+        ret = [
+            Glb.MAGIC + utils.int_to_bytes(Glb.VERSION) + utils.int_to_bytes(glb_len) +
+            utils.int_to_bytes(json_len) + Glb.CHUNK_JSON,
+            json_chunk,
+            b" " * (json_len - len(json_chunk)),
+            utils.int_to_bytes(buffer_len) + Glb.CHUNK_BIN
+        ]
+        # 各 buffer 原样输出，只追加对齐用的 0
+        for buffer in self.buffers:
+            ret.append(buffer)
+            ret.append(b"\0" * (utils.padded_len(len(buffer)) - len(buffer)))
         return ret
+
+    def write_to(self, f):
+        utils.write_segments(f, self.segments())
+
+    def as_bytes(self) -> bytearray:
+        return bytearray().join(self.segments())
@@ -1,38 +1,115 @@
 from pathlib import Path
-from urllib.request import urlopen
+from urllib.parse import unquote_to_bytes
 from .element import Element
+from .document import Document
+import base64
 import json
+import mmap
 import shutil
+import struct
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+GLB_MAGIC = b"glTF"
+GLB_HEADER = struct.Struct("<4sII")
+CHUNK_HEADER = struct.Struct("<II")
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
 
-def read_gltf(fin):
-    with open(fin, encoding='utf-8') as f:
-        data = json.load(f)
-        if hasattr(data, "extensionsUsed"):
-            for key in data["extensionsUsed"]:
-                Element.extensions.add(key)
-        # gltf = json.load(f, object_hook=lambda d: Element(**d))
-        gltf = Element(**data)
-
-    buffers = []
-    for buffer in gltf.buffers:
-        buffers.append(read_buffer(buffer.uri, Path(fin).parent))
 
+def read_gltf(fin, compact=False):
+    gltf = read_json(fin, compact)
+    buffers = read_buffers(fin, gltf.buffers)
     delattr(gltf, "buffers")
     return gltf, buffers
 
 
+def read_buffers(fin, buffers):
+    # glb 中没有 uri 的 buffer 指向文件内的 BIN 块
+    return [read_bin_chunk(fin) if buffer.uri is None else read_buffer(buffer.uri, Path(fin).parent)
+            for buffer in buffers]
+
+
+def read_json(fin, compact=False):
+    if is_glb(fin):
+        data = json.loads(read_json_chunk(fin))
+    else:
+        with open(fin, encoding='utf-8') as f:
+            data = json.load(f)
+    if compact:
+        return Document(data)
+    if hasattr(data, "extensionsUsed"):
+        for key in data["extensionsUsed"]:
+            Element.extensions.add(key)
+    # gltf = json.load(f, object_hook=lambda d: Element(**d))
+    return Element(**data)
+
+
+def is_glb(fin):
+    with open(fin, "rb") as f:
+        return f.read(4) == GLB_MAGIC
+
+
+def read_chunk_header(f):
+    data = f.read(CHUNK_HEADER.size)
+    if len(data) < CHUNK_HEADER.size:
+        return None, None
+    return CHUNK_HEADER.unpack(data)
+
+
+def read_json_chunk(fin):
+    """读取 glb 的文件头与 JSON 块，返回 JSON 字节"""
+    with open(fin, "rb") as f:
+        magic, version, length = GLB_HEADER.unpack(f.read(GLB_HEADER.size))
+        if version != 2:
+            raise ValueError(f"unsupported glb version {version}: {fin}")
+        chunk_length, chunk_type = read_chunk_header(f)
+        if chunk_type != JSON_CHUNK:
+            raise ValueError(f"first glb chunk is not JSON: {fin}")
+        return f.read(chunk_length)
+
+
+def read_bin_chunk(fin):
+    """映射 glb 的 BIN 块，返回不复制数据的 memoryview"""
+    with open(fin, "rb") as f:
+        f.seek(GLB_HEADER.size)
+        json_length, _ = read_chunk_header(f)
+        f.seek(json_length, 1)
+        chunk_length, chunk_type = read_chunk_header(f)
+        if chunk_type != BIN_CHUNK:
+            raise ValueError(f"glb has no BIN chunk: {fin}")
+        offset = f.tell()
+    # 切片的 obj 仍是 mmap，多进程时子进程自行映射同一文件
+    return map_file(fin)[offset:offset + chunk_length]
+
+
 def read_buffer(uri, parent):
     if is_data_uri(uri):
-        with urlopen(uri) as response:
-            return response.read()
+        return read_data_uri(uri)
+
+    return map_file(parent / uri)
+
+
+def read_data_uri(uri):
+    # data:[<mediatype>][;base64],<data>，直接解码，不经过 urlopen
+    header, _, data = uri.partition(",")
+    if header.endswith(";base64"):
+        return memoryview(base64.b64decode(data))
+    return memoryview(unquote_to_bytes(data))
+
+
+def map_file(path):
+    # 只读映射，按需分页读入；切片得到的 memoryview 不复制数据
+    with open(path, "rb") as f:
+        if 0 == f.seek(0, 2):
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
 
-    with open(parent / uri, "rb") as f:
-        return f.read()
+def is_mapped(buffer):
+    return isinstance(buffer, memoryview) and isinstance(buffer.obj, mmap.mmap)
 
 
 def is_data_uri(uri):
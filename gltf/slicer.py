@@ -1,9 +1,31 @@
-from .gltf import Glb
+from .gltf import Glb, Gltf, Axis, MAT_Y, MAT_Z
+import numpy as np
 import utils
 from .element import Element
+import hashlib
+import json
 import sys
 
 
+BYTE = 5120
+SHORT = 5122
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+COMPONENT_DTYPES = {5120: "i1", 5121: "u1", 5122: "<i2", 5123: "<u2", 5125: "<u4", 5126: "<f4"}
+TYPE_COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+QUANTIZATION = "KHR_mesh_quantization"
+INSTANCING = "EXT_mesh_gpu_instancing"
+FEATURES = "EXT_mesh_features"
+INSTANCE_FEATURES = "EXT_instance_features"
+SHORT_MAX = 32767
+# 扩展名作为 JSON 键时不做大小写转换
+Element.extensions.update((INSTANCING, FEATURES, INSTANCE_FEATURES))
+
+
 def get__attribute(obj, name):
     ret = []
     for key, value in obj.__dict__.items():
@@ -15,24 +37,105 @@ def get__attribute(obj, name):
     return ret
 
 
-def set__texture(material, name, texture_indices):
+def get__attributes(primitive):
+    attributes = primitive.attributes
+    return attributes if type(attributes) == dict else attributes.__dict__
+
+
+def set__texture(material, name, texture_map):
     for key, value in material.__dict__.items():
         if key == name:
-            setattr(material, key, texture_indices.index(value))
+            setattr(material, key, texture_map[value])
         elif type(value) == Element:
-            set__texture(value, name, texture_indices)
+            set__texture(value, name, texture_map)
+
+
+def remove__textures(obj):
+    # 纹理引用 (textureInfo) 都带有 index
+    for key, value in list(obj.__dict__.items()):
+        if type(value) == Element:
+            if value.index is not None:
+                delattr(obj, key)
+            else:
+                remove__textures(value)
+
+
+def position_quantization(positions):
+    """顶点量化为 int16 的 (中心, 缩放, 反量化矩阵)；各轴共用缩放，法线不受节点矩阵影响"""
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    center = (low + high) / 2
+    extent = (high - low).max() / 2
+    scale = SHORT_MAX / extent if extent > 0 else 1.
+    dequantize = np.diag([1 / scale] * 3 + [1.])
+    dequantize[0:3, 3] = center
+    return center, scale, dequantize
+
+
+def fold_matrix(matrix, dequantize):
+    """列主序的节点矩阵右乘反量化矩阵"""
+    if (dequantize == np.eye(4)).all():
+        return matrix
+    return (np.array(matrix).reshape(4, 4, order="F") @ dequantize).reshape(-1, order="F").tolist()
+
+
+def extensions_list(quantized=False, instanced=False, features=False):
+    """输出 glb 声明的 (extensionsUsed, extensionsRequired)，没有扩展时为 None
+
+    量化的顶点与 GPU 实例不支持扩展就无法显示，须列为 required；要素 id 只是元数据，只列为 used
+    """
+    required = [name for name, emitted in ((QUANTIZATION, quantized), (INSTANCING, instanced)) if emitted]
+    used = required + [name for name, emitted in ((INSTANCE_FEATURES, instanced), (FEATURES, features)) if emitted]
+    return used or None, required or None
+
+
+def batch_attribute(feature_ids):
+    # 3D Tiles 1.1 的 glb 内容用 EXT_mesh_features 的要素 id 代替 b3dm 的 _BATCHID
+    return "_FEATURE_ID_0" if feature_ids else "_BATCHID"
+
+
+def features_extension(count):
+    return {FEATURES: {"featureIds": [{"featureCount": count, "attribute": 0}]}}
+
+
+def as_json(obj):
+    return obj.as_dict(False) if hasattr(obj, "as_dict") else obj
+
+
+def index_map(indices):
+    return {index: i for i, index in enumerate(indices)}
+
+
+class Dependencies:
+    def __init__(self, accessors, buffer_views, materials, textures, images, samplers):
+        self.accessors = accessors
+        self.buffer_views = buffer_views
+        self.materials = materials
+        self.textures = textures
+        self.images = images
+        self.samplers = samplers
+        self.accessor_map = index_map(accessors)
+        self.buffer_view_map = index_map(buffer_views)
+        self.material_map = index_map(materials)
+        self.texture_map = index_map(textures)
+        self.image_map = index_map(images)
+        self.sampler_map = index_map(samplers)
 
 
 class Slicer(Element):
+    # 切分时顶点属性按 KHR_mesh_quantization 编码为整数
+    quantized = False
+
     def __init__(self, gltf, **kwargs):
 
         super().__init__(gltf, **kwargs)
-        self.__matrices = [[] for _ in range(len(self.meshes))]
-        self.__extras = [[] for _ in range(len(self.meshes))]
+        # 增量构建用的摘要缓存，共用的 bufferView 只求一次
+        self.__view_digests = {}
+        self.__mesh_digests = {}
         scene = 0 if self.scene is None else self.scene
-        for root in self.scenes[scene].nodes:
-            # root = self.scenes[scene].nodes[0]
-            self.__parse_node(root)
+        self.__parse_nodes(self.scenes[scene].nodes)
+        # 材质树只遍历一次，记录每个材质引用的纹理
+        self.__material_textures = [list(dict.fromkeys(get__attribute(material, "index")))
+                                    for material in self.materials or []]
         if not self.images:
             return
 
@@ -42,40 +145,107 @@ class Slicer(Element):
 
             image.uri = image.uri.replace("\\", "/")
 
-    def __parse_node(self, node_index, *, matrix=utils.Matrix4(), extras=None):
-        node = self.nodes[node_index]
-
-        if node.matrix:
-            matrix = matrix.clone().multiply(utils.Matrix4(node.matrix))
-            if node.scale:
-                print('warning: check for scale', node)
-            if node.rotation:
-                print('warning: check for rotation', node)
-            if node.translation:
-                print('warning: check for translation', node)
-            # TODO Check for translation/scale/rotation here?
-        else:
-            if node.scale:
-                matrix = matrix.clone().scaleBy(node.scale)
-            if node.rotation:
-                matrix = matrix.clone().rotateBy(node.rotation)
-            if node.translation:
-                matrix = matrix.clone().translateBy(node.translation)
-
-        if node.extras:
-            extras = node.extras
-
-        if node.mesh is not None:
-            self.__matrices[node.mesh].append(matrix)
-            if extras is not None:
-                self.__extras[node.mesh].append(extras.as_dict())
+    def __local_matrices(self):
+        # 节点的局部矩阵 T * R * S，一次性批量计算
+        count = len(self.nodes)
+        fields = {"matrix": ([], []), "translation": ([], []), "rotation": ([], []), "scale": ([], [])}
+        for index, node in enumerate(self.nodes):
+            if node.matrix:
+                if node.scale:
+                    print('warning: check for scale', node)
+                if node.rotation:
+                    print('warning: check for rotation', node)
+                if node.translation:
+                    print('warning: check for translation', node)
+                names = ("matrix",)
+            else:
+                names = ("translation", "rotation", "scale")
+            for name in names:
+                value = getattr(node, name)
+                if value:
+                    fields[name][0].append(index)
+                    fields[name][1].append(value)
+
+        def field(name, default):
+            ret = np.tile(np.array(default, dtype=np.float64), (count, 1))
+            indices, values = fields[name]
+            if indices:
+                ret[indices] = values
+            return ret
+
+        has_matrix = np.zeros(count, dtype=bool)
+        has_matrix[fields["matrix"][0]] = True
+        matrices = field("matrix", np.eye(4).ravel()).reshape(-1, 4, 4).transpose(0, 2, 1)
+        translations = field("translation", [0., 0., 0.])
+        rotations = field("rotation", [0., 0., 0., 1.])
+        scales = field("scale", [1., 1., 1.])
+
+        x, y, z, w = rotations.T
+        rotation = np.stack([
+            1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+            2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+            2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)
+        ], axis=1).reshape(-1, 3, 3)
+        trs = np.zeros((count, 4, 4))
+        trs[:, 0:3, 0:3] = rotation * scales[:, None, :]
+        trs[:, 0:3, 3] = translations
+        trs[:, 3, 3] = 1
+        return np.where(has_matrix[:, None, None], matrices, trs)
+
+    def __parse_nodes(self, roots):
+        # 迭代先序遍历（不受递归深度限制），只记录每次访问的节点、父访问、深度和生效的 extras 节点
+        visits, parents, depths, extras = [], [], [], []
+        stack = [(root, -1, 0, -1) for root in reversed(roots)]
+        while stack:
+            node_index, parent, depth, extras_index = stack.pop()
+            node = self.nodes[node_index]
+            if node.extras:
+                extras_index = node_index
+            visit = len(visits)
+            visits.append(node_index)
+            parents.append(parent)
+            depths.append(depth)
+            extras.append(extras_index)
+            if node.children:
+                stack.extend((child, visit, depth + 1, extras_index) for child in reversed(node.children))
+
+        # 世界矩阵按层批量相乘：world = parent * local
+        local = self.__local_matrices()
+        visits = np.array(visits, dtype=np.int64)
+        parents = np.array(parents, dtype=np.int64)
+        depths = np.array(depths, dtype=np.int64)
+        world = np.empty((len(visits), 4, 4))
+        by_depth = np.argsort(depths, kind="stable")
+        bounds = np.searchsorted(depths[by_depth], np.arange(depths.max() + 2 if len(depths) else 1))
+        for depth in range(len(bounds) - 1):
+            level = by_depth[bounds[depth]:bounds[depth + 1]]
+            if depth == 0:
+                world[level] = local[visits[level]]
+            else:
+                world[level] = world[parents[level]] @ local[visits[level]]
+
+        # 按 mesh 分组，组内保持先序；每个 mesh 的实例矩阵是同一数组上的切片
+        node_meshes = np.array([-1 if node.mesh is None else node.mesh for node in self.nodes], dtype=np.int64)
+        meshes = node_meshes[visits]
+        instances = np.flatnonzero(meshes >= 0)
+        instances = instances[np.argsort(meshes[instances], kind="stable")]
+        self.__matrices = world[instances]
+        self.__offsets = np.concatenate([[0], np.cumsum(np.bincount(meshes[instances], minlength=len(self.meshes)))])
 
-        if node.children:
-            for index in node.children:
-                self.__parse_node(index, matrix=matrix, extras=extras)
+        self.__extras = [[] for _ in range(len(self.meshes))]
+        converted = {}
+        for visit in instances:
+            extras_index = extras[visit]
+            if extras_index < 0:
+                continue
+            if extras_index not in converted:
+                value = self.nodes[extras_index].extras
+                converted[extras_index] = value if type(value) == dict else value.as_dict()
+            self.__extras[meshes[visit]].append(converted[extras_index])
 
     def get_matrices(self, mesh_id):
-        return self.__matrices[mesh_id]
+        """(N,4,4) 的实例世界矩阵"""
+        return self.__matrices[self.__offsets[mesh_id]:self.__offsets[mesh_id + 1]]
 
     def get_extras(self, mesh_id):
         return self.__extras[mesh_id]
@@ -84,90 +254,393 @@ class Slicer(Element):
     def meshes_count(self):
         return len(self.meshes)
 
-    def slice_primitives(self, primitives: list):
-        accessor_indices = self.__get_accessor_indices(primitives)
-        material_indices = self.__get_material_indices(primitives)
-        texture_indices = self.__get_texture_indices(material_indices)
-        sampler_indices = self.__get_sampler_indices(texture_indices)
-        image_indices = self.__get_image_indices(texture_indices)
-        buffer_view_indices = list(set([
-            self.accessors[id].buffer_view for id in accessor_indices] + [
-            self.images[id].buffer_view for id in image_indices if self.images[id].buffer_view is not None]))
-        return Glb([self.__get_buffer(buffer_view_indices)],
-            meshes=self.__get_meshes(primitives, accessor_indices, material_indices),
-            accessors=self.__get_accessors(accessor_indices, buffer_view_indices),
-            buffer_views=self.__get_buffer_views(buffer_view_indices),
-            materials=self.__get_materials(material_indices, image_indices),
-            textures=self.__get_textures(len(texture_indices)),
-            images=self.__get_images(image_indices, buffer_view_indices),
-            samplers=self.__get_samplers(len(sampler_indices))
+    def slice_primitives(self, primitives: list, instances=None):
+        """instances 为 glTF 坐标系中的 (N,4,4) 实例矩阵，给出时用 EXT_mesh_gpu_instancing 输出"""
+        deps = self.dependencies(primitives)
+        buffers = self.__get_buffers(deps.buffer_views)
+        buffer_views = self.__get_buffer_views(deps.buffer_views)
+        accessors = self.__get_accessors(deps)
+        nodes = None
+        if instances is not None:
+            nodes = [self.__instance_node(instances, buffers, buffer_views, accessors)]
+        used, required = extensions_list(instanced=instances is not None)
+        return Glb(buffers,
+            nodes=nodes,
+            meshes=self.__get_meshes(primitives, deps),
+            accessors=accessors,
+            buffer_views=buffer_views,
+            materials=self.__get_materials(deps),
+            textures=self.__get_textures(deps),
+            images=self.__get_images(deps),
+            samplers=[self.samplers[id] for id in deps.samplers],
+            extensions_used=used,
+            extensions_required=required
         )
 
-    def __get_images(self, image_indices, buffer_view_indices):
-        ret = [self.images[id].clone() for id in image_indices]
-        for image in ret:
-            if image.buffer_view:
-                image.buffer_view = buffer_view_indices.index(
-                    image.buffer_view)
+    def slice_mesh(self, mesh_id: int, instances=None):
+        if Slicer.quantized and self.is_splittable(mesh_id):
+            return self.__slice_parts([(mesh_id, self.all_triangles(mesh_id))], instances=instances)
+        return self.slice_primitives(self.meshes[mesh_id].primitives, instances)
+
+    def __instance_node(self, matrices, buffers, buffer_views, accessors):
+        """EXT_mesh_gpu_instancing 的节点：各实例的 TRS 追加为 accessor，节点本身不再变换
+
+        实例序号作为 EXT_instance_features 的要素 id，与按实例排列的 extras 对应
+        """
+        translation, rotation, scale = utils.trs(matrices)
+        properties = [("TRANSLATION", translation, "VEC3")]
+        if not np.allclose(rotation, [0, 0, 0, 1]):
+            properties.append(("ROTATION", rotation, "VEC4"))
+        if not np.allclose(scale, 1):
+            properties.append(("SCALE", scale, "VEC3"))
+        properties.append(("_FEATURE_ID_0", np.arange(len(matrices)), "SCALAR"))
+
+        offset = sum(utils.padded_len(len(buffer)) for buffer in buffers)
+        attributes = {}
+        for name, values, type in properties:
+            data = values.astype("<f4").tobytes()
+            buffers.append(data)
+            buffer_views.append(Element(buffer=0, byte_offset=offset, byte_length=len(data)))
+            offset += utils.padded_len(len(data))
+            accessors.append(Element(
+                buffer_view=len(buffer_views) - 1, component_type=FLOAT, count=len(values), type=type))
+            attributes[name] = len(accessors) - 1
+        return Element(mesh=0, extensions={INSTANCING: {"attributes": attributes},
+                                           INSTANCE_FEATURES: features_extension(len(matrices))[FEATURES]})
+
+    def slice_batch(self, mesh_ids: list, matrices: list, feature_ids=False):
+        """多个 mesh 合并为一个 glb：每个 mesh 一个带矩阵的节点，顶点带 _BATCHID 属性
+
+        feature_ids 时改为 EXT_mesh_features 的 _FEATURE_ID_0
+        """
+        if Slicer.quantized and all(map(self.is_splittable, mesh_ids)):
+            return self.__slice_parts([(id, self.all_triangles(id)) for id in mesh_ids], matrices,
+                                      feature_ids=feature_ids)
+        primitives = [p for id in mesh_ids for p in self.meshes[id].primitives]
+        deps = self.dependencies(primitives)
+        buffers = self.__get_buffers(deps.buffer_views)
+        buffer_views = self.__get_buffer_views(deps.buffer_views)
+        accessors = self.__get_accessors(deps)
+        offset = sum(utils.padded_len(len(buffer)) for buffer in buffers)
+        meshes = []
+        for batch_id, mesh_id in enumerate(mesh_ids):
+            mesh = self.__get_meshes(self.meshes[mesh_id].primitives, deps)[0]
+            counts = [accessors[get__attributes(p)["POSITION"]].count for p in mesh.primitives]
+            batch_ids = np.full(max(counts), batch_id, dtype="<f4").tobytes()
+            buffers.append(batch_ids)
+            buffer_views.append(Element(
+                buffer=0, byte_offset=offset, byte_length=len(batch_ids), target=ARRAY_BUFFER))
+            offset += utils.padded_len(len(batch_ids))
+            # 同一 mesh 的各 primitive 共用一段 batch id，按各自的顶点数建 accessor
+            for p, count in zip(mesh.primitives, counts):
+                accessors.append(Element(
+                    buffer_view=len(buffer_views) - 1, component_type=FLOAT, count=count, type="SCALAR"))
+                setattr(p.attributes, batch_attribute(feature_ids), len(accessors) - 1)
+                if feature_ids:
+                    p.extensions = Element(**features_extension(len(mesh_ids)))
+            meshes.append(mesh)
+
+        used, required = extensions_list(features=feature_ids)
+        return Glb(buffers,
+            scenes=[Element(nodes=list(range(len(mesh_ids))))],
+            nodes=[Element(mesh=i, matrix=matrix) for i, matrix in enumerate(matrices)],
+            meshes=meshes,
+            accessors=accessors,
+            buffer_views=buffer_views,
+            materials=self.__get_materials(deps),
+            textures=self.__get_textures(deps),
+            images=self.__get_images(deps),
+            samplers=[self.samplers[id] for id in deps.samplers],
+            extensions_used=used,
+            extensions_required=required
+        )
 
-        return ret
+    def accessor_rows(self, accessor_id):
+        """accessor 每个元素的原始字节，(count, 元素字节数) 的 uint8 数组，直接引用源 buffer"""
+        accessor = self.accessors[accessor_id]
+        size = np.dtype(COMPONENT_DTYPES[accessor.component_type]).itemsize * TYPE_COMPONENTS[accessor.type]
+        view = self.buffer_views[accessor.buffer_view]
+        offset = (view.byte_offset or 0) + (accessor.byte_offset or 0)
+        return np.ndarray((accessor.count, size), np.uint8, buffer=self.buffers[view.buffer],
+                          offset=offset, strides=(view.byte_stride or size, 1))
+
+    def accessor_values(self, accessor_id):
+        """(count, 分量数) 的数值数组"""
+        accessor = self.accessors[accessor_id]
+        return self.accessor_rows(accessor_id).view(COMPONENT_DTYPES[accessor.component_type])
+
+    def triangles(self, primitive):
+        """primitive 的三角形顶点索引，(F,3)"""
+        if primitive.indices is None:
+            count = self.accessors[get__attributes(primitive)["POSITION"]].count
+            return np.arange(count - count % 3, dtype=np.int64).reshape(-1, 3)
+        indices = self.accessor_values(primitive.indices).reshape(-1)
+        return indices[:len(indices) - len(indices) % 3].astype(np.int64).reshape(-1, 3)
+
+    def is_splittable(self, mesh_id):
+        # 只处理三角形、float 顶点、无 morph target 与 sparse 的 mesh
+        for p in self.meshes[mesh_id].primitives:
+            if p.mode not in (None, TRIANGLES) or p.targets:
+                return False
+            accessors = list(get__attributes(p).values()) + ([] if p.indices is None else [p.indices])
+            if any(self.accessors[id].sparse or self.accessors[id].buffer_view is None for id in accessors):
+                return False
+            if self.accessors[get__attributes(p)["POSITION"]].component_type != FLOAT:
+                return False
+        return True
+
+    def all_triangles(self, mesh_id: int):
+        return [np.arange(len(self.triangles(p))) for p in self.meshes[mesh_id].primitives]
+
+    def slice_triangles(self, mesh_id: int, triangles: list, instances=None):
+        """只取 mesh 各 primitive 中给定序号的三角形，顶点压缩后输出为 glb；instances 同 slice_mesh"""
+        return self.__slice_parts([(mesh_id, triangles)], instances=instances)
+
+    def __slice_parts(self, parts: list, matrices: list = None, instances=None, feature_ids=False):
+        """各 (mesh id, 各 primitive 的三角形序号) 重建为一个 mesh，顶点压缩后输出为 glb
+
+        给出 matrices 时按合批输出：每个 mesh 一个带矩阵的节点，顶点带 _BATCHID 属性。
+        给出 instances 时单个 mesh 用 EXT_mesh_gpu_instancing 输出。
+        quantized 时顶点属性编码为整数，反量化矩阵并入节点（或实例）矩阵
+        """
+        full = self.dependencies([p for mesh_id, _ in parts for p in self.meshes[mesh_id].primitives])
+        # 原 accessor 不再引用，只保留嵌入图片的 bufferView
+        image_views = [self.images[id].buffer_view for id in full.images
+                       if self.images[id].buffer_view is not None]
+        deps = Dependencies([], image_views, full.materials, full.textures, full.images, full.samplers)
+        buffers = self.__get_buffers(deps.buffer_views)
+        buffer_views = self.__get_buffer_views(deps.buffer_views)
+        accessors = []
+        offset = sum(utils.padded_len(len(buffer)) for buffer in buffers)
+
+        def add_accessor(data, target, byte_stride=None, **kwargs):
+            nonlocal offset
+            data = data.tobytes()
+            buffers.append(data)
+            buffer_views.append(Element(buffer=0, byte_offset=offset, byte_length=len(data),
+                                        byte_stride=byte_stride, target=target))
+            offset += utils.padded_len(len(data))
+            accessors.append(Element(buffer_view=len(buffer_views) - 1, **kwargs))
+            return len(accessors) - 1
+
+        meshes, dequantize = [], []
+        # 只有实际量化了顶点才声明 KHR_mesh_quantization
+        quantized = False
+        for batch_id, (mesh_id, triangles) in enumerate(parts):
+            primitives = [(p, *np.unique(self.triangles(p)[selected].reshape(-1), return_inverse=True))
+                          for p, selected in zip(self.meshes[mesh_id].primitives, triangles) if len(selected)]
+            quantization = None
+            if Slicer.quantized and primitives:
+                quantization = position_quantization(np.concatenate([
+                    self.accessor_values(get__attributes(p)["POSITION"])[vertices] for p, vertices, _ in primitives]))
+                quantized = True
+            dequantize.append(np.eye(4) if quantization is None else quantization[2])
+
+            ret = []
+            for p, vertices, indices in primitives:
+                attributes = {}
+                for name, id in get__attributes(p).items():
+                    rows, kwargs = self.__encode_attribute(name, id, vertices, quantization)
+                    # 顶点属性的步长须为 4 的倍数
+                    size = rows.shape[1]
+                    stride = utils.padded_len(size)
+                    if stride != size:
+                        rows = np.pad(rows, ((0, 0), (0, stride - size)))
+                    attributes[name] = add_accessor(rows, ARRAY_BUFFER, stride if stride != size else None, **kwargs)
+                extensions = None
+                if matrices is not None:
+                    batch_ids = np.full(len(vertices), batch_id, dtype="<f4")
+                    attributes[batch_attribute(feature_ids)] = add_accessor(
+                        batch_ids, ARRAY_BUFFER, component_type=FLOAT, count=len(vertices), type="SCALAR")
+                    if feature_ids:
+                        extensions = features_extension(len(parts))
+                # 65535 为图元重启保留值
+                short = len(vertices) < 65535
+                indices = add_accessor(
+                    indices.astype("<u2" if short else "<u4"), ELEMENT_ARRAY_BUFFER,
+                    component_type=UNSIGNED_SHORT if short else UNSIGNED_INT, count=len(indices), type="SCALAR")
+                material = None if p.material is None else deps.material_map[p.material]
+                ret.append(Element(indices=indices, attributes=attributes, material=material, extensions=extensions))
+            meshes.append(Element(primitives=ret))
+
+        scenes = None if matrices is None else [Element(nodes=list(range(len(matrices))))]
+        if instances is not None:
+            # 实例矩阵作用在节点矩阵之前，反量化并入各实例矩阵
+            nodes = [self.__instance_node(instances @ dequantize[0], buffers, buffer_views, accessors)]
+        else:
+            if matrices is None:
+                matrices = [MAT_Y if Gltf.up_direction is Axis.Y else MAT_Z]
+            nodes = [Element(mesh=i, matrix=fold_matrix(matrix, dequantize[i]))
+                     for i, matrix in enumerate(matrices)]
+        used, required = extensions_list(quantized, instances is not None, feature_ids and matrices is not None)
+        return Glb(buffers,
+            scenes=scenes,
+            nodes=nodes,
+            meshes=meshes,
+            accessors=accessors,
+            buffer_views=buffer_views,
+            materials=self.__get_materials(deps),
+            textures=self.__get_textures(deps),
+            images=self.__get_images(deps),
+            samplers=[self.samplers[id] for id in deps.samplers],
+            extensions_used=used,
+            extensions_required=required
+        )
 
-    def __get_textures(self, count):
-        if self.textures:
-            return self.textures[:count]
+    def __encode_attribute(self, name, id, vertices, quantization):
+        """选中顶点的属性行与 accessor 参数；quantized 时 POSITION、NORMAL 与 [0,1] 内的 TEXCOORD 编码为整数"""
+        source = self.accessors[id]
+        rows = self.accessor_rows(id)[vertices]
+        kwargs = {"component_type": source.component_type, "normalized": source.normalized,
+                  "count": len(vertices), "type": source.type}
+        if name == "POSITION":
+            values = rows.view(COMPONENT_DTYPES[FLOAT])
+            if quantization is not None:
+                center, scale, _ = quantization
+                values = np.rint((values - center) * scale).astype("<i2")
+                rows = values.view(np.uint8)
+                kwargs.update(component_type=SHORT, normalized=None)
+            return rows, dict(kwargs, min=values.min(axis=0).tolist(), max=values.max(axis=0).tolist())
+        if quantization is None or source.component_type != FLOAT or source.normalized:
+            return rows, kwargs
+
+        values = rows.view(COMPONENT_DTYPES[FLOAT])
+        if name == "NORMAL":
+            values = np.rint(np.clip(values, -1, 1) * 127).astype("i1")
+            return values.view(np.uint8), dict(kwargs, component_type=BYTE, normalized=True)
+        # 超出 [0,1] 的纹理坐标（重复贴图）需要 KHR_texture_transform 才能反量化，保持 float
+        if name.startswith("TEXCOORD_") and len(values) and values.min() >= 0 and values.max() <= 1:
+            values = np.rint(values * 65535).astype("<u2")
+            return values.view(np.uint8), dict(kwargs, normalized=True, component_type=UNSIGNED_SHORT)
+        return rows, kwargs
+
+    def slice_proxy(self, translation, positions, triangles, materials):
+        """简化的代理几何输出为 glb：只有 POSITION，同一材质的三角形为一个 primitive，材质去掉纹理"""
+        buffers, buffer_views, accessors = [], [], []
+        offset = 0
 
-    def __get_samplers(self, count):
-        if self.samplers:
-            return self.samplers[:count]
+        def add_accessor(data, target, byte_stride=None, **kwargs):
+            nonlocal offset
+            data = data.tobytes()
+            buffers.append(data)
+            buffer_views.append(Element(buffer=0, byte_offset=offset, byte_length=len(data),
+                                        byte_stride=byte_stride, target=target))
+            offset += utils.padded_len(len(data))
+            accessors.append(Element(buffer_view=len(buffer_views) - 1, **kwargs))
+            return len(accessors) - 1
+
+        node = Element(mesh=0, translation=translation)
+        if Slicer.quantized:
+            center, scale, dequantize = position_quantization(positions)
+            positions = np.rint((positions - center) * scale).astype("<i2")
+            dequantize[0:3, 3] += translation
+            node = Element(mesh=0, matrix=dequantize.reshape(-1, order="F").tolist())
+            # int16 的 VEC3 补齐到 8 字节步长
+            position = add_accessor(np.pad(positions, ((0, 0), (0, 1))), ARRAY_BUFFER, 8, component_type=SHORT,
+                                    count=len(positions), type="VEC3",
+                                    min=positions.min(axis=0).tolist(), max=positions.max(axis=0).tolist())
+        else:
+            position = add_accessor(positions, ARRAY_BUFFER, component_type=FLOAT, count=len(positions), type="VEC3",
+                                    min=positions.min(axis=0).tolist(), max=positions.max(axis=0).tolist())
+        short = len(positions) < 65535
+        material_ids = [int(id) for id in np.unique(materials) if id >= 0]
+        material_map = index_map(material_ids)
+        primitives = []
+        for id in np.unique(materials).tolist():
+            indices = triangles[materials == id].reshape(-1)
+            indices = add_accessor(
+                indices.astype("<u2" if short else "<u4"), ELEMENT_ARRAY_BUFFER,
+                component_type=UNSIGNED_SHORT if short else UNSIGNED_INT, count=len(indices), type="SCALAR")
+            primitives.append(Element(indices=indices, attributes={"POSITION": position},
+                                      material=material_map.get(id)))
+
+        materials = [self.materials[id].clone() for id in material_ids]
+        for material in materials:
+            remove__textures(material)
+        used, required = extensions_list(Slicer.quantized)
+        return Glb(buffers,
+            nodes=[node],
+            meshes=[Element(primitives=primitives)],
+            accessors=accessors,
+            buffer_views=buffer_views,
+            materials=materials,
+            extensions_used=used,
+            extensions_required=required
+        )
 
-    def __get_texture_indices(self, material_indices):
-        ret = []
-        for id in material_indices:
-            ret += get__attribute(self.materials[id], "index")
+    def dependencies(self, primitives):
+        """mesh -> accessors -> bufferViews, material -> textures -> images/samplers 的闭包"""
+        accessors = set()
+        for p in primitives:
+            if p.indices is not None:
+                accessors.add(p.indices)
+            accessors.update(set(get__attributes(p).values()))
+        accessors = list(accessors)
+
+        materials = list(dict.fromkeys(
+            p.material for p in primitives if p.material is not None))
+        textures = list(dict.fromkeys(
+            texture for id in materials for texture in self.__material_textures[id]))
+        images = list(dict.fromkeys(
+            self.textures[id].source for id in textures if self.textures[id].source is not None))
+        samplers = list(dict.fromkeys(
+            self.textures[id].sampler for id in textures if self.textures[id].sampler is not None))
+        buffer_views = list(set([self.accessors[id].buffer_view for id in accessors] + [
+            self.images[id].buffer_view for id in images if self.images[id].buffer_view is not None]))
+
+        return Dependencies(accessors, buffer_views, materials, textures, images, samplers)
+
+    def mesh_digest(self, mesh_id):
+        """mesh 的输入摘要：mesh、accessor、bufferView、材质与纹理的 json，以及引用的 bufferView 字节"""
+        if mesh_id in self.__mesh_digests:
+            return self.__mesh_digests[mesh_id]
+
+        deps = self.dependencies(self.meshes[mesh_id].primitives)
+        digest = hashlib.sha1()
+        for items, ids in ((self.meshes, [mesh_id]), (self.accessors, deps.accessors),
+                           (self.buffer_views, deps.buffer_views), (self.materials, deps.materials),
+                           (self.textures, deps.textures), (self.images, deps.images), (self.samplers, deps.samplers)):
+            digest.update(json.dumps([as_json(items[id]) for id in sorted(ids)], sort_keys=True).encode())
+        for index in sorted(deps.buffer_views):
+            if index not in self.__view_digests:
+                self.__view_digests[index] = hashlib.sha1(self.__get_buffers([index])[0]).digest()
+            digest.update(self.__view_digests[index])
+        self.__mesh_digests[mesh_id] = digest.hexdigest()
+        return self.__mesh_digests[mesh_id]
+
+    def __get_images(self, deps):
+        ret = [self.images[id].clone() for id in deps.images]
+        for image in ret:
+            if image.buffer_view is not None:
+                image.buffer_view = deps.buffer_view_map[image.buffer_view]
 
         return ret
-        # return [self.materials[id].pbr_metallic_roughness.base_color_texture.index for id in material_indices if
-        #         self.materials[id].pbr_metallic_roughness.base_color_texture is not None]
-
-    def __get_image_indices(self, texture_indices):
-        return [self.textures[id].source for id in texture_indices]
 
-    def __get_sampler_indices(self, texture_indices):
-        return [self.textures[id].sampler for id in texture_indices if self.textures[id].sampler is not None]
+    def __get_textures(self, deps):
+        ret = [self.textures[id].clone() for id in deps.textures]
+        for texture in ret:
+            if texture.source is not None:
+                texture.source = deps.image_map[texture.source]
+            if texture.sampler is not None:
+                texture.sampler = deps.sampler_map[texture.sampler]
 
-    def slice_mesh(self, mesh_id: int):
-        return self.slice_primitives(self.meshes[mesh_id].primitives)
-
-    def __get_accessor_indices(self, primitives):
-        ret = set()
-        for p in primitives:
-            ret.add(p.indices)
-            ret.update(set(p.attributes.__dict__.values()))
-
-        return list(ret)
-
-    def __get_material_indices(self, primitives):
-        return [primitive.material for primitive in primitives if primitive.material is not None]
+        return ret
 
-    def __get_materials(self, material_indices, texture_indices):
+    def __get_materials(self, deps):
         materials = [self.materials[id].clone()
-                     for id in material_indices]
+                     for id in deps.materials]
 
         for material in materials:
-            set__texture(material, "index", texture_indices)
-            # if material.pbr_metallic_roughness.base_color_texture is not None:
-            #     material.pbr_metallic_roughness.base_color_texture.index = texture_indices.index(
-            #         material.pbr_metallic_roughness.base_color_texture.index)
+            set__texture(material, "index", deps.texture_map)
         return materials
 
-    def __get_buffer(self, buffer_view_indices):
-        ret = bytearray()
+    def __get_buffers(self, buffer_view_indices):
+        # 返回源 buffer 上的 memoryview，由 Glb 逐个补齐 4 字节对齐，不在此复制
+        ret = []
         for index in buffer_view_indices:
             view = self.buffer_views[index]
             byte_offset = view.byte_offset if view.byte_offset else 0
-            padding = utils.padded_len(view.byte_length) - view.byte_length;
-            ret += self.buffers[view.buffer][byte_offset:byte_offset + view.byte_length]
-            ret += b'\0' * padding
+            ret.append(memoryview(self.buffers[view.buffer])[byte_offset:byte_offset + view.byte_length])
         return ret
 
     def __get_buffer_views(self, buffer_view_indices):
@@ -181,17 +654,17 @@ class Slicer(Element):
 
         return ret
 
-    def __get_accessors(self, accessor_indices, buffer_view_indices):
-        ret = [self.accessors[index].clone() for index in accessor_indices]
+    def __get_accessors(self, deps):
+        ret = [self.accessors[index].clone() for index in deps.accessors]
         for accessor in ret:
-            accessor.buffer_view = buffer_view_indices.index(
-                accessor.buffer_view)
+            if accessor.buffer_view is not None:
+                accessor.buffer_view = deps.buffer_view_map[accessor.buffer_view]
         return ret
 
     def get_bounding_box_by_primitives(self, primitives: list):
         box = utils.Box3()
         for primitive in primitives:
-            accessor = self.accessors[primitive.attributes.POSITION]
+            accessor = self.accessors[get__attributes(primitive)["POSITION"]]
             box.expand_by_point(accessor.max).expand_by_point(accessor.min)
 
         return box
@@ -199,15 +672,17 @@ class Slicer(Element):
     def get_bounding_box(self, mesh_id: int):
         return self.get_bounding_box_by_primitives(self.meshes[mesh_id].primitives)
 
-    def __get_meshes(self, primitives, accessor_indices, material_indices):
+    def __get_meshes(self, primitives, deps):
         ret = []
         for p in primitives:
-            indices = accessor_indices.index(p.indices)
-            attributes = {k: accessor_indices.index(v)
-                          for k, v in p.attributes.__dict__.items()}
+            indices = None
+            if p.indices is not None:
+                indices = deps.accessor_map[p.indices]
+            attributes = {k: deps.accessor_map[v]
+                          for k, v in get__attributes(p).items()}
             material = None
             if p.material is not None:
-                material = material_indices.index(p.material)
+                material = deps.material_map[p.material]
             ret.append(Element(indices=indices,
                        attributes=attributes, material=material))
         return [Element(primitives=ret)]
@@ -1,10 +1,12 @@
 import typer
 from converter.gltf_to_tileset import gltf_to_tileset
-from tileset import Measure
+from converter.bvh import Bvh
+from tileset import Measure, Format
 from gltf import Glb, Element, io, Axis
 import json
 from pathlib import Path
 from tileset import B3dm
+from utils.profiler import Profiler
 import timeit
 from urllib.request import urlopen
 import logging
@@ -15,62 +17,110 @@ logger = logging.getLogger(__name__)
 
 @app.command()
 def tileset(
-        fin: str = typer.Argument(..., help="input gltf path"),
+        fin: str = typer.Argument(..., help="input gltf or glb path"),
         fout: str = typer.
     Argument(
         None,
         help="Optional output tileset.json path (defaults to the path of the input file)"),
         measure: Measure = typer.Option(Measure.METER, help="measure of attributes in gltf buffers"),
-        up_direction: Axis = typer.Option(Axis.Y, "--up", help="up direction used in gltf coordinate system")):
+        up_direction: Axis = typer.Option(Axis.Y, "--up", help="up direction used in gltf coordinate system"),
+        workers: int = typer.Option(1, help="number of processes used to slice and encode tile contents"),
+        bvh: Bvh = typer.Option(Bvh.SAH, help="algorithm used to build the bounding volume hierarchy"),
+        compact: bool = typer.Option(False, help="load the gltf with the compact lazy document model (for large inputs)"),
+        dedup: bool = typer.Option(False, help="merge meshes with identical geometry and materials into instanced contents"),
+        incremental: bool = typer.Option(True, help="only re-slice and rewrite contents whose input meshes changed since the last run (see tileset.manifest.json)"),
+        batch_bytes: int = typer.Option(0, help="merge adjacent small meshes into batched b3dm of up to this many buffer bytes (0 to disable)"),
+        batch_vertices: int = typer.Option(0, help="merge adjacent small meshes into batched b3dm of up to this many vertices (0 to disable)"),
+        quantize_instances: bool = typer.Option(False, help="write quantized positions and oct-encoded normals in i3dm instance tables"),
+        external_depth: int = typer.Option(0, help="move tiles deeper than this many levels into external tilesets (0 to disable)"),
+        external_nodes: int = typer.Option(0, help="move tiles beyond this many per tileset file into external tilesets (0 to disable)"),
+        implicit: bool = typer.Option(False, help="write 3D Tiles 1.1 implicit octree tiling with .subtree availability files"),
+        subtree_levels: int = typer.Option(4, help="levels per subtree file in implicit tiling"),
+        split_triangles: int = typer.Option(0, help="split meshes with more triangles than this into octree cells (0 to disable)"),
+        split_bytes: int = typer.Option(0, help="split meshes larger than this many bytes into octree cells (0 to disable)"),
+        lod: bool = typer.Option(False, help="give internal tiles simplified proxy contents and REPLACE refinement"),
+        lod_resolution: int = typer.Option(32, help="vertex clustering cells along the longest side of a proxy"),
+        quantize: bool = typer.Option(False, help="store positions, normals and texture coordinates as integers with KHR_mesh_quantization"),
+        gzip: bool = typer.Option(False, help="also write precompressed .gz files next to contents and tileset json (for gzip_static)"),
+        gzip_min_bytes: int = typer.Option(1024, help="do not compress files smaller than this many bytes"),
+        gzip_threads: int = typer.Option(4, help="number of threads compressing .gz files while tiles are written"),
+        content_format: Format = typer.Option(Format.B3DM, "--format", help="tile content format: b3dm/i3dm (3D Tiles 1.0) or glb with EXT_mesh_gpu_instancing (3D Tiles 1.1)"),
+        profile: str = typer.Option(None, help="write a json report of time, memory and counters per stage to this path"),
+        profile_stage: str = typer.Option(None, help="also dump cProfile stats of this stage (e.g. write_contents) next to the report"),
+        profile_slowest: int = typer.Option(10, help="number of slowest contents listed in the report"),
+        profile_memory: bool = typer.Option(False, help="also record the tracemalloc peak per stage in the report (slower, timings include the tracing)")):
     """split gltf model to 3d tiles"""
     start = timeit.default_timer()
+    profiler = Profiler(profile is not None, slowest=profile_slowest, cprofile_stage=profile_stage,
+                        memory=profile_memory).start()
 
     if not fout:
         fout = Path(fin).parent / "tileset.json"
 
-    gltf_to_tileset(fin, fout, measure, up_direction)
+    gltf_to_tileset(fin, fout, measure, up_direction, workers, bvh, compact, dedup, incremental,
+                    batch_bytes, batch_vertices, quantize_instances, external_depth, external_nodes, implicit, subtree_levels,
+                    split_triangles, split_bytes, lod, lod_resolution, quantize,
+                    gzip, gzip_min_bytes, gzip_threads, content_format, profiler)
     end = timeit.default_timer()
+    profiler.write(profile, command="tileset", input=str(fin), workers=workers)
     typer.echo(f"completed in: {end - start}s")
 
 
 @app.command()
 def glb(
-        fin: str = typer.Argument(..., help="input gltf path"),
+        fin: str = typer.Argument(..., help="input gltf or glb path"),
         fout: str = typer.
     Argument(
         None,
         help="Optional output glb path (defaults to the path of the input file)"
-            )):
+            ),
+        profile: str = typer.Option(None, help="write a json report of time, memory and counters per stage to this path"),
+        profile_stage: str = typer.Option(None, help="also dump cProfile stats of this stage (e.g. write) next to the report"),
+        profile_memory: bool = typer.Option(False, help="also record the tracemalloc peak per stage in the report (slower, timings include the tracing)")):
     """convert gltf to glb"""
-    gltf, buffers = io.read_gltf(fin)
+    profiler = Profiler(profile is not None, cprofile_stage=profile_stage, memory=profile_memory).start()
+    with profiler.stage("read_gltf"):
+        gltf, buffers = io.read_gltf(fin)
 
     if not fout:
         fout = Path(fin).with_suffix(".glb")
-    with open(fout, "wb") as f:
-        f.write(Glb(buffers, **gltf.as_dict(False)).as_bytes())
-    io.copy_textures(fin, fout, gltf.images)
+    if Path(fout).resolve() == Path(fin).resolve():
+        # 输入的 BIN 块是映射的，写同一文件会破坏正在读取的数据
+        raise typer.BadParameter("output path must differ from the input glb")
+    with profiler.stage("write"), open(fout, "wb") as f:
+        Glb(buffers, **gltf.as_dict(False)).write_to(f)
+    with profiler.stage("copy_textures"):
+        io.copy_textures(fin, fout, gltf.images)
+    profiler.count("output_bytes", Path(fout).stat().st_size)
+    profiler.write(profile, command="glb", input=str(fin))
     typer.echo("completed")
 
 
 @app.command()
 def b3dm(
-        fin: str = typer.Argument(..., help="input gltf path"),
+        fin: str = typer.Argument(..., help="input gltf or glb path"),
         fout: str = typer.
     Argument(
         None,
         help="Optional output b3dm path(defaults to the path of the input file)"
-            )):
+            ),
+        profile: str = typer.Option(None, help="write a json report of time, memory and counters per stage to this path"),
+        profile_stage: str = typer.Option(None, help="also dump cProfile stats of this stage (e.g. write) next to the report"),
+        profile_memory: bool = typer.Option(False, help="also record the tracemalloc peak per stage in the report (slower, timings include the tracing)")):
     """convert gltf to b3dm"""
-    gltf, buffers = io.read_gltf(fin)
+    profiler = Profiler(profile is not None, cprofile_stage=profile_stage, memory=profile_memory).start()
+    with profiler.stage("read_gltf"):
+        gltf, buffers = io.read_gltf(fin)
 
     if not fout:
         fout = Path(fin).with_suffix(".b3dm")
 
-    with open(fout, "wb") as f:
-        f.write(
-            B3dm("b3dm",
-                 Glb(buffers, **gltf.as_dict(False)).as_bytes()).as_bytes())
-    io.copy_textures(fin, fout, gltf.images)
+    with profiler.stage("write"), open(fout, "wb") as f:
+        B3dm("b3dm", Glb(buffers, **gltf.as_dict(False))).write_to(f)
+    with profiler.stage("copy_textures"):
+        io.copy_textures(fin, fout, gltf.images)
+    profiler.count("output_bytes", Path(fout).stat().st_size)
+    profiler.write(profile, command="b3dm", input=str(fin))
     typer.echo("completed")
 
 
@@ -0,0 +1,57 @@
+import json
+import sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmark.synthetic import generate  # noqa: E402
+from gltf import Slicer, io  # noqa: E402
+from gltf.gltf import Gltf  # noqa: E402
+from tileset import Tile, I3dm  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def global_options():
+    """转换会改写各类上的全局选项，每个测试结束后恢复"""
+    saved = Gltf.up_direction, Tile.format, Tile.measure, I3dm.quantized, Slicer.quantized
+    yield
+    Gltf.up_direction, Tile.format, Tile.measure, I3dm.quantized, Slicer.quantized = saved
+
+
+@pytest.fixture
+def synthetic(tmp_path):
+    """写出合成的 glTF，参数同 benchmark.synthetic.generate"""
+    def make(name="model", **kwargs):
+        kwargs.setdefault("meshes", 8)
+        kwargs.setdefault("vertices", 64)
+        return generate(tmp_path / "input" / f"{name}.gltf", **kwargs)
+    return make
+
+
+@pytest.fixture
+def duplicated(synthetic):
+    """mesh 1-3 与 mesh 0 几何相同，mesh 0 另有第二个实例；去重后合并为一组"""
+    fin = synthetic(meshes=6)
+    with open(fin) as f:
+        gltf = json.load(f)
+    for mesh_id in (1, 2, 3):
+        gltf["meshes"][mesh_id] = gltf["meshes"][0]
+    gltf["nodes"].append({"mesh": 0, "translation": [3.0, 5.0, 7.0], "rotation": [0, 0.6, 0, 0.8]})
+    gltf["scenes"][0]["nodes"].append(len(gltf["nodes"]) - 1)
+    with open(fin, "w") as f:
+        json.dump(gltf, f)
+    return fin
+
+
+def read_slicer(fin):
+    gltf, buffers = io.read_gltf(fin)
+    return Slicer(gltf, buffers=buffers)
+
+
+def convert(fin, fout, **options):
+    """转换并返回输出目录中所有文件的 {相对路径: 内容}"""
+    from converter import gltf_to_tileset
+    gltf_to_tileset(str(fin), str(fout), **options)
+    parent = Path(fout).parent
+    return {str(path.relative_to(parent)): path.read_bytes() for path in sorted(parent.rglob("*")) if path.is_file()}
@@ -0,0 +1,10 @@
+from benchmark.stages import STAGES, run_once
+from tileset import Tile, Format
+
+
+def test_run_once_restores_format(synthetic, tmp_path):
+    Tile.format = Format.B3DM
+    times = run_once(synthetic(), tmp_path, content_format=Format.GLB)
+    assert set(times) == set(STAGES)
+    assert Tile.format is Format.B3DM
+    assert any(path.suffix == ".glb" for path in tmp_path.iterdir())
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from conftest import read_slicer
+from gltf.gltf import Axis, Gltf
+from converter.dedup import dedup_meshes
+from converter.gltf_to_tileset import explicit_tiles
+from converter.implicit import instances
+from converter.lod import leaf_geometry
+
+
+def world_bounds(slicer, groups, split_triangles=0):
+    """各内容 tile 按运行时的放置方式展开后的 glTF 坐标范围"""
+    tiles = explicit_tiles(slicer, groups, 0, 0, split_triangles, 0)
+    points = np.concatenate([leaf_geometry(slicer, tile)[0] for tile in tiles])
+    return points.min(axis=0), points.max(axis=0)
+
+
+def test_dedup_groups(duplicated):
+    groups, saved = dedup_meshes(read_slicer(duplicated))
+    assert groups[0] == [0, 1, 2, 3]
+    assert saved > 0
+
+
+@pytest.mark.parametrize("up_direction", [Axis.Y, Axis.Z])
+@pytest.mark.parametrize("split_triangles", [0, 40])
+def test_dedup_keeps_world_bounds(duplicated, up_direction, split_triangles):
+    Gltf.up_direction = up_direction
+    slicer = read_slicer(duplicated)
+    groups, _ = dedup_meshes(slicer)
+    single = [[id] for id in range(slicer.meshes_count)]
+    expected = world_bounds(slicer, single, split_triangles)
+    actual = world_bounds(slicer, groups, split_triangles)
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-4)
+
+
+@pytest.mark.parametrize("up_direction", [Axis.Y, Axis.Z])
+def test_dedup_keeps_implicit_bounds(duplicated, up_direction):
+    Gltf.up_direction = up_direction
+    slicer = read_slicer(duplicated)
+    groups, _ = dedup_meshes(slicer)
+    _, _, _, expected, _ = instances(slicer, [[id] for id in range(slicer.meshes_count)])
+    _, _, _, actual, _ = instances(slicer, groups)
+    np.testing.assert_allclose(actual.bounds().list, expected.bounds().list, rtol=1e-5, atol=1e-4)
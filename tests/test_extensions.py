@@ -0,0 +1,45 @@
+import json
+import struct
+import pytest
+from conftest import convert
+from tileset import Format
+
+QUANTIZATION = "KHR_mesh_quantization"
+INSTANCING = "EXT_mesh_gpu_instancing"
+FEATURES = "EXT_mesh_features"
+INSTANCE_FEATURES = "EXT_instance_features"
+
+
+def glb_json(data):
+    """内容文件中 glb 的 JSON 块，b3dm/i3dm 跳过前面的表头"""
+    start = data.index(b"glTF")
+    length, = struct.unpack_from("<I", data, start + 12)
+    return json.loads(data[start + 20:start + 20 + length])
+
+
+def declared(files):
+    """各内容声明的 (extensionsUsed, extensionsRequired) 的并集"""
+    used, required = set(), set()
+    for name, data in files.items():
+        if name.endswith((".glb", ".b3dm", ".i3dm")):
+            gltf = glb_json(data)
+            used.update(gltf.get("extensionsUsed", []))
+            required.update(gltf.get("extensionsRequired", []))
+            assert set(gltf.get("extensionsRequired", [])) <= set(gltf.get("extensionsUsed", []))
+    return used, required
+
+
+@pytest.mark.parametrize("options, used, required", [
+    ({}, set(), set()),
+    ({"quantize": True}, {QUANTIZATION}, {QUANTIZATION}),
+    ({"content_format": Format.GLB}, {INSTANCING, INSTANCE_FEATURES}, {INSTANCING}),
+    ({"content_format": Format.GLB, "quantize": True},
+     {QUANTIZATION, INSTANCING, INSTANCE_FEATURES}, {QUANTIZATION, INSTANCING}),
+    ({"content_format": Format.GLB, "batch_bytes": 1 << 20}, {INSTANCING, INSTANCE_FEATURES, FEATURES}, {INSTANCING}),
+    ({"content_format": Format.GLB, "implicit": True}, {FEATURES}, set()),
+])
+def test_extensions_required(synthetic, tmp_path, options, used, required):
+    files = convert(synthetic(meshes=6, instances=1), tmp_path / "single" / "tileset.json", **options)
+    files.update(convert(synthetic("instanced", meshes=2, instances=3), tmp_path / "instanced" / "tileset.json",
+                         **options))
+    assert declared(files) == (used, required)
@@ -0,0 +1,27 @@
+import gzip
+from conftest import convert
+
+
+def gz_files(files):
+    return sorted(name for name in files if name.endswith(".gz"))
+
+
+def test_sidecars_match_contents(synthetic, tmp_path):
+    fout = tmp_path / "out" / "tileset.json"
+    files = convert(synthetic(), fout, gzip=True, gzip_min_bytes=0)
+    assert gz_files(files)
+    for name in gz_files(files):
+        assert gzip.decompress(files[name]) == files[name[:-3]]
+
+
+def test_sidecars_removed_without_gzip(synthetic, tmp_path):
+    fin = synthetic()
+    fout = tmp_path / "out" / "tileset.json"
+    assert gz_files(convert(fin, fout, gzip=True, gzip_min_bytes=0))
+    # 内容都未变，只是不再压缩
+    assert gz_files(convert(fin, fout)) == []
+    assert gz_files(convert(fin, fout, gzip=True, gzip_min_bytes=0))
+    # 输入与选项都未变时内容直接保留
+    assert gz_files(convert(fin, fout, gzip=True, gzip_min_bytes=0))
+    assert gz_files(convert(fin, fout)) == []
+    assert gz_files(convert(fin, fout)) == []
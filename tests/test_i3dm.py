@@ -0,0 +1,47 @@
+import json
+import struct
+import numpy as np
+import pytest
+from tileset import I3dm
+
+GLB = b"glTF" + bytes(20)
+
+
+def instance_matrices(count):
+    matrices = np.tile(np.eye(4), (count, 1, 1))
+    matrices[:, 0:3, 3] = np.arange(count * 3).reshape(count, 3)
+    matrices[:, 0, 0] = matrices[:, 1, 1] = matrices[:, 2, 2] = 1 + np.arange(count)
+    return matrices
+
+
+def parse(data):
+    magic, version, byte_length, feature_json, feature_bin, batch_json, batch_bin, gltf_format = \
+        struct.unpack_from("<4s7I", data)
+    assert magic == b"i3dm" and version == 1 and gltf_format == I3dm.GLTF_FORMAT
+    assert byte_length == len(data)
+    header = {"featureTableJSONByteLength": feature_json, "featureTableBinaryByteLength": feature_bin,
+              "batchTableJSONByteLength": batch_json, "batchTableBinaryByteLength": batch_bin}
+    offset = 32 + feature_json
+    return header, json.loads(data[32:offset]), offset
+
+
+@pytest.mark.parametrize("quantized", [False, True])
+@pytest.mark.parametrize("count", [1, 3, 5])
+def test_i3dm_sections_aligned(count, quantized):
+    I3dm.quantized = quantized
+    content = I3dm("0", GLB, instance_matrices(count), extras=[{"id": i} for i in range(count)])
+    data = content.as_bytes()
+    header, feature_table, feature_bin_start = parse(data)
+
+    assert (32 + header["featureTableJSONByteLength"]) % 8 == 0
+    assert header["featureTableBinaryByteLength"] % 8 == 0
+    assert header["batchTableJSONByteLength"] % 8 == 0
+    glb_start = feature_bin_start + header["featureTableBinaryByteLength"] + header["batchTableJSONByteLength"]
+    assert glb_start % 8 == 0
+    assert data[glb_start:glb_start + len(GLB)] == GLB
+
+    assert feature_table["INSTANCES_LENGTH"] == count
+    # 各属性都在二进制体内
+    for name, value in feature_table.items():
+        if isinstance(value, dict):
+            assert value["byteOffset"] < header["featureTableBinaryByteLength"], name
@@ -0,0 +1,86 @@
+import json
+import struct
+import numpy as np
+import pytest
+from conftest import convert
+from gltf.gltf import Axis
+
+
+def read_subtree(data):
+    """.subtree 的 (tile, content, 子 subtree) 可用性 bool 数组"""
+    magic, version, json_len, bin_len = struct.unpack_from("<4sIQQ", data)
+    assert magic == b"subt" and version == 1
+    assert len(data) == 24 + json_len + bin_len
+    subtree = json.loads(data[24:24 + json_len])
+    body = data[24 + json_len:]
+
+    def bits(availability, count):
+        if "constant" in availability:
+            return np.full(count, bool(availability["constant"]))
+        view = subtree["bufferViews"][availability["bitstream"]]
+        assert view["byteOffset"] % 8 == 0
+        stream = np.frombuffer(body, np.uint8, view["byteLength"], view["byteOffset"])
+        ret = np.unpackbits(stream, bitorder="little")[:count].astype(bool)
+        assert ret.sum() == availability["availableCount"]
+        return ret
+    return bits, subtree
+
+
+def decode_morton(index, depth):
+    x = y = z = 0
+    for i in range(depth):
+        x |= (index >> 3 * i & 1) << i
+        y |= (index >> 3 * i + 1 & 1) << i
+        z |= (index >> 3 * i + 2 & 1) << i
+    return x, y, z
+
+
+def walk_subtrees(parent, implicit):
+    """从根 subtree 展开所有可用的 tile，返回 (可用 tile 集合, 有内容的 tile 集合, 读到的 subtree uri)"""
+    levels = implicit["subtreeLevels"]
+    template = implicit["subtrees"]["uri"]
+    tiles, contents, visited = set(), set(), []
+    stack = [(0, 0, 0, 0)]
+    while stack:
+        level, x, y, z = stack.pop()
+        uri = template.format(level=level, x=x, y=y, z=z)
+        visited.append(uri)
+        bits, subtree = read_subtree((parent / uri).read_bytes())
+        count = ((1 << 3 * levels) - 1) // 7
+        tile_bits = bits(subtree["tileAvailability"], count)
+        content_bits = bits(subtree["contentAvailability"][0], count)
+        assert not (content_bits & ~tile_bits).any()
+        for index in np.flatnonzero(tile_bits).tolist():
+            depth = next(d for d in range(levels) if index < ((1 << 3 * (d + 1)) - 1) // 7)
+            dx, dy, dz = decode_morton(index - ((1 << 3 * depth) - 1) // 7, depth)
+            key = (level + depth, (x << depth) + dx, (y << depth) + dy, (z << depth) + dz)
+            tiles.add(key)
+            if content_bits[index]:
+                contents.add(key)
+        child_bits = bits(subtree["childSubtreeAvailability"], 1 << 3 * levels)
+        for index in np.flatnonzero(child_bits).tolist():
+            dx, dy, dz = decode_morton(index, levels)
+            stack.append((level + levels, (x << levels) + dx, (y << levels) + dy, (z << levels) + dz))
+    return tiles, contents, visited
+
+
+@pytest.mark.parametrize("subtree_levels", [1, 2, 4])
+@pytest.mark.parametrize("up_direction", [Axis.Y, Axis.Z])
+def test_subtree_availability(synthetic, tmp_path, subtree_levels, up_direction):
+    fout = tmp_path / "out" / "tileset.json"
+    files = convert(synthetic(meshes=60, instances=2), fout, implicit=True, subtree_levels=subtree_levels,
+                    up_direction=up_direction)
+    implicit = json.loads(files["tileset.json"])["root"]["implicitTiling"]
+    assert implicit["subtreeLevels"] == subtree_levels
+
+    tiles, contents, visited = walk_subtrees(fout.parent, implicit)
+    # 每个 subtree 只由父 subtree 引用一次，且没有未被引用的 subtree
+    assert sorted(visited) == sorted(name for name in files if name.endswith(".subtree"))
+    # 可用 tile 的父节点也可用
+    for level, x, y, z in tiles:
+        assert level < implicit["availableLevels"]
+        assert level == 0 or (level - 1, x >> 1, y >> 1, z >> 1) in tiles
+    assert max(level for level, _, _, _ in tiles) == implicit["availableLevels"] - 1
+    # 有内容的 tile 与写出的内容文件一一对应
+    assert {"{}_{}_{}_{}.b3dm".format(*key) for key in contents} == {
+        name for name in files if name.endswith(".b3dm")}
@@ -0,0 +1,26 @@
+import pytest
+from conftest import read_slicer
+from converter.bvh import Bvh, build
+from converter.group import split_group
+from converter.gltf_to_tileset import explicit_tiles
+from converter.lod import build_lods
+
+
+def walk(tile):
+    stack = [tile]
+    while stack:
+        tile = stack.pop()
+        yield tile
+        stack.extend(tile.children)
+
+
+@pytest.mark.parametrize("resolution", [4, 32, 512])
+def test_proxy_error_not_below_children(synthetic, resolution):
+    slicer = read_slicer(synthetic(meshes=24, instances=2))
+    tiles = explicit_tiles(slicer, [[id] for id in range(slicer.meshes_count)], 0, 0, 0, 0)
+    tiles.sort(key=lambda tile: tile.box_world.diagonal)
+    root, proxies = build_lods(slicer, build(split_group(tiles), Bvh.SAH), resolution)
+    assert proxies
+    for tile in walk(root):
+        for child in tile.children:
+            assert tile.geometric_error >= child.geometric_error
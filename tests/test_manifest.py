@@ -0,0 +1,70 @@
+import json
+import numpy as np
+import pytest
+from conftest import convert
+
+
+def mtimes(parent):
+    return {path.name: path.stat().st_mtime_ns for path in parent.iterdir() if path.suffix in (".b3dm", ".i3dm")}
+
+
+def scale_positions(fin, mesh_id, factor):
+    """把 mesh 的 POSITION 数据就地缩放，其余 mesh 不变"""
+    with open(fin) as f:
+        gltf = json.load(f)
+    accessor = gltf["accessors"][gltf["meshes"][mesh_id]["primitives"][0]["attributes"]["POSITION"]]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    accessor["min"] = (np.array(accessor["min"]) * factor).tolist()
+    accessor["max"] = (np.array(accessor["max"]) * factor).tolist()
+    with open(fin, "w") as f:
+        json.dump(gltf, f)
+    path = fin.with_suffix(".bin")
+    data = bytearray(path.read_bytes())
+    start = view["byteOffset"] + accessor.get("byteOffset", 0)
+    end = start + accessor["count"] * 12
+    data[start:end] = (np.frombuffer(data[start:end], "<f4") * factor).astype("<f4").tobytes()
+    path.write_bytes(data)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unchanged_input_skips_contents(synthetic, tmp_path, capsys, workers):
+    fin = synthetic(instances=2)
+    fout = tmp_path / "out" / "tileset.json"
+    first = convert(fin, fout, workers=workers)
+    before = mtimes(fout.parent)
+    capsys.readouterr()
+
+    assert convert(fin, fout, workers=workers) == first
+    assert "input unchanged" in capsys.readouterr().out
+    assert mtimes(fout.parent) == before
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_changed_mesh_rewrites_only_its_content(synthetic, tmp_path, workers):
+    fin = synthetic()
+    fout = tmp_path / "out" / "tileset.json"
+    first = convert(fin, fout, workers=workers)
+    before = mtimes(fout.parent)
+
+    scale_positions(fin, 3, 1.5)
+    files = convert(fin, fout, workers=workers)
+    after = mtimes(fout.parent)
+    assert files["3.b3dm"] != first["3.b3dm"]
+    assert {name for name in after if after[name] != before[name]} == {"3.b3dm"}
+    # 与从头转换的结果一致
+    assert files == convert(fin, tmp_path / "fresh" / "tileset.json")
+
+
+def test_changed_options_rewrite_and_remove_stale(synthetic, tmp_path):
+    fin = synthetic()
+    fout = tmp_path / "out" / "tileset.json"
+    batched = convert(fin, fout, batch_bytes=1 << 20)
+    files = convert(fin, fout)
+    assert set(files) != set(batched)
+    assert files == convert(fin, tmp_path / "fresh" / "tileset.json")
+
+    # 选项变化后输入摘要不可信，须重新切分，但内容摘要一致的文件不重写
+    before = mtimes(fout.parent)
+    files = convert(fin, fout, quantize_instances=True)
+    assert mtimes(fout.parent) == before
+    assert files == convert(fin, tmp_path / "fresh" / "tileset.json", quantize_instances=True)
@@ -0,0 +1,32 @@
+import json
+import tracemalloc
+import pytest
+from utils.profiler import Profiler
+
+
+@pytest.mark.parametrize("memory", [False, True])
+def test_memory_tracing_opt_in(tmp_path, memory):
+    profiler = Profiler(True, memory=memory).start()
+    assert tracemalloc.is_tracing() == memory
+    with profiler.stage("allocate"):
+        data = [bytes(1024) for _ in range(1024)]
+    del data
+    profiler.write(tmp_path / "report.json")
+    assert not tracemalloc.is_tracing()
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert report["memory_tracing"] == memory
+    stage, = report["stages"]
+    assert ("tracemalloc_peak" in stage) == memory
+    if stage["process_rss_peak"] is not None:
+        assert 0 <= stage["rss_peak_growth"] <= stage["process_rss_peak"]
+
+
+def test_disabled_profiler_records_nothing(tmp_path):
+    profiler = Profiler(memory=True).start()
+    assert not tracemalloc.is_tracing()
+    with profiler.stage("noop"):
+        profiler.count("tiles")
+    profiler.write(tmp_path / "report.json")
+    assert profiler.stages == [] and profiler.counters == {}
+    assert not (tmp_path / "report.json").exists()
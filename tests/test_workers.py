@@ -0,0 +1,21 @@
+import pytest
+from conftest import convert
+from gltf.gltf import Axis
+from tileset import Format
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"up_direction": Axis.Z, "dedup": True},
+    {"batch_bytes": 1 << 16, "quantize_instances": True},
+    {"implicit": True, "subtree_levels": 2},
+    {"split_triangles": 50, "lod": True},
+    {"quantize": True, "content_format": Format.GLB},
+    {"external_nodes": 4, "gzip": True, "gzip_min_bytes": 0},
+], ids=["default", "dedup-z", "batch", "implicit", "split-lod", "quantize-glb", "external-gzip"])
+def test_workers_write_identical_bytes(duplicated, tmp_path, options):
+    serial = convert(duplicated, tmp_path / "serial" / "tileset.json", workers=1, **options)
+    parallel = convert(duplicated, tmp_path / "parallel" / "tileset.json", workers=3, **options)
+    assert sorted(serial) == sorted(parallel)
+    for name in serial:
+        assert serial[name] == parallel[name], name
@@ -1,5 +1,7 @@
-from .tile import Tile, Measure
+from .tile import Tile, Measure, Format, content_matrices, tile_transforms
 from .tileset import Tileset
 from .content import Content
 from .b3dm import B3dm
 from .i3dm import I3dm
+from .gltf_content import GltfContent
+from .subtree import Subtree
@@ -7,6 +7,10 @@ class B3dm(Content):
         {"BATCH_LENGTH": 0}, separators=(",", ":")).encode("utf-8")
     __HEADER_LEN = 28
 
+    def __init__(self, name: str, content, *, batch_length=0, extras=None) -> None:
+        super().__init__(name, content, extras=extras)
+        self.__batch_length = batch_length
+
     def _magic(self):
         return B3dm.__MAGIC
 
@@ -18,7 +22,7 @@ class B3dm(Content):
         return self._name + ".b3dm"
 
     def feature_json(self):
+        if self.__batch_length:
+            return json.dumps(
+                {"BATCH_LENGTH": self.__batch_length}, separators=(",", ":")).encode("utf-8")
         return B3dm.__FEATURE_JSON
-
-    def as_bytes(self) -> bytes:
-        return self._header() + self._body()
@@ -1,14 +1,16 @@
 import utils
 from abc import ABC, abstractmethod
+from gltf import Glb
 import json
 
 
 class Content(ABC):
     VERSION = 1
 
-    def __init__(self, name: str, content: bytes, *, extras=None) -> None:
+    def __init__(self, name: str, content, *, extras=None) -> None:
         self._name = name
         # self._box = box
+        # content 可以是 bytes，也可以是 Glb，后者写出时不再复制几何数据
         self.content = content
         self.__extras = extras
 
@@ -37,50 +39,54 @@ class Content(ABC):
             return json.dumps({"extras": self.__extras}, separators=(",", ":")).encode("utf-8")
         return b''
 
-    def _batch_json_len(self):
-        return utils.padded_len((len(self._batch_json())), padding=8)
-
-    def _feature_json_len(self):
-        return utils.padded_len(len(self.feature_json()) + self._header_len(), padding=8) - self._header_len()
-
     @abstractmethod
     def _header_len(self):
         pass
 
-    def _byte_len(self):
-        return self._header_len() + self._feature_json_len() + len(self._feature_bin()) + self._batch_json_len() + len(self.content)
-
-    def _header(self) -> bytes:
-        ret = bytearray(self._magic())
-        ret += utils.int_to_bytes(Content.VERSION)
-        # feature_json = self.feature_json()
-        feature_json_len = self._feature_json_len()
-        feature_bytes = self._feature_bin()
-        feature_bytes_len = len(feature_bytes)
-        batch_json_len = self._batch_json_len()
-        ret += utils.int_to_bytes(utils.padded_len(self._byte_len()))
-        ret += utils.int_to_bytes(feature_json_len)
-        ret += utils.int_to_bytes(feature_bytes_len)
-        ret += utils.int_to_bytes(batch_json_len)
-        ret += utils.int_to_bytes(0)
-        return ret
+    def _header_tail(self) -> bytes:
+        return b''
 
     def _feature_bin(self):
         return b''
 
-    def _body(self) -> bytes:
+    def _content_segments(self) -> list:
+        if isinstance(self.content, Glb):
+            return self.content.segments()
+        return [self.content]
+
+    def segments(self) -> list:
         feature_json = self.feature_json()
-        # feature_json_len = utils.padded_len(len(feature_json))
-        ret = bytearray(feature_json.ljust(self._feature_json_len(), b' '))
-        feature_bytes = self._feature_bin()
-        ret += feature_bytes
-        ret += bytearray(self._batch_json().ljust(self._batch_json_len(), b' '))
-        ret += self.content
-        byteLen = self._byte_len()
-        padding = utils.padded_len(byteLen) - byteLen
-        ret += b'\0' * padding
-        return ret
+        feature_bin = self._feature_bin()
+        batch_json = self._batch_json()
+        content = self._content_segments()
+
+        feature_json_len = utils.padded_len(
+            len(feature_json) + self._header_len(), padding=8) - self._header_len()
+        # 二进制体按 8 字节对齐，后面的 batch table 与 glb 才能对齐
+        feature_bin_len = utils.padded_len(len(feature_bin), padding=8)
+        batch_json_len = utils.padded_len(len(batch_json), padding=8)
+        byte_len = self._header_len() + feature_json_len + feature_bin_len + \
+            batch_json_len + utils.segments_len(content)
+
+        header = bytearray(self._magic())
+        header += utils.int_to_bytes(Content.VERSION)
+        header += utils.int_to_bytes(utils.padded_len(byte_len))
+        header += utils.int_to_bytes(feature_json_len)
+        header += utils.int_to_bytes(feature_bin_len)
+        header += utils.int_to_bytes(batch_json_len)
+        header += utils.int_to_bytes(0)
+        header += self._header_tail()
+        return [
+            header,
+            feature_json, b' ' * (feature_json_len - len(feature_json)),
+            feature_bin, b'\0' * (feature_bin_len - len(feature_bin)),
+            batch_json, b' ' * (batch_json_len - len(batch_json)),
+            *content,
+            b'\0' * (utils.padded_len(byte_len) - byte_len)
+        ]
+
+    def write_to(self, f):
+        utils.write_segments(f, self.segments())
 
-    @abstractmethod
     def as_bytes(self) -> bytes:
-        pass
+        return b''.join(self.segments())
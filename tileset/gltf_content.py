@@ -0,0 +1,26 @@
+from gltf import Glb
+
+
+class GltfContent:
+    """3D Tiles 1.1 直接引用的 glb 内容，没有 b3dm/i3dm 的文件头与要素表
+
+    extras 在建立 glb 时放到 glTF 根上，按要素 id 排列：合批内容为 EXT_mesh_features 的 mesh 序号，
+    多实例内容为 EXT_instance_features 的实例序号，单个 mesh 只有一行
+    """
+
+    def __init__(self, name: str, content) -> None:
+        self._name = name
+        self.content = content
+
+    @property
+    def uri(self):
+        return self._name + ".glb"
+
+    @property
+    def dict(self):
+        return {"uri": self.uri}
+
+    def segments(self) -> list:
+        if isinstance(self.content, Glb):
+            return self.content.segments()
+        return [self.content]
@@ -1,15 +1,31 @@
 import json
+from functools import cached_property
+import numpy as np
 import utils
-import struct
 from .content import Content
 
+QUANTIZED_MAX = 65535
+
+
+def oct_encode(vectors):
+    """单位向量八面体编码为 2 个 uint16（Cesium AttributeCompression.octEncodeInRange）"""
+    norm = np.abs(vectors).sum(axis=1, keepdims=True)
+    p = vectors / np.where(norm > 0, norm, 1)
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    sign_x = np.where(x >= 0, 1., -1.)
+    sign_y = np.where(y >= 0, 1., -1.)
+    x, y = np.where(z < 0, (1 - np.abs(y)) * sign_x, x), np.where(z < 0, (1 - np.abs(x)) * sign_y, y)
+    return np.rint((np.stack([x, y], axis=1) * 0.5 + 0.5) * QUANTIZED_MAX).astype("<u2")
+
 
 class I3dm(Content):
     __MAGIC = b'i3dm'
     GLTF_FORMAT = 1
     __HEADER_LEN = 32
+    # 输出 POSITION_QUANTIZED 与 NORMAL_*_OCT32P
+    quantized = False
 
-    def __init__(self, name: str, content: bytes, matrices: list, *, extras=None) -> None:
+    def __init__(self, name: str, content: bytes, matrices, *, extras=None) -> None:
         super().__init__(name, content, extras=extras)
         self.__matrices = matrices
 
@@ -24,6 +40,9 @@ class I3dm(Content):
         return self._name + ".i3dm"
 
     def feature_json(self):
+        if I3dm.quantized:
+            return self.__quantized_json()
+
         instances_count = len(self.__matrices)
         return json.dumps({
             "INSTANCES_LENGTH": instances_count,
@@ -42,17 +61,54 @@ class I3dm(Content):
         }, separators=(",", ":")).encode("utf-8")
 
     def _feature_bin(self):
-        positions = []
-        ups = []
-        rights = []
-        scales = []
-        for matrix in self.__matrices:
-            positions += matrix.position
-            ups += matrix.up
-            rights += matrix.right
-            scales += matrix.scale
-        ret = positions + ups + rights + scales
-        return struct.pack('<%sf' % len(ret), *ret)
-
-    def as_bytes(self) -> bytes:
-        return self._header() + utils.int_to_bytes(1) + self._body()
+        if I3dm.quantized:
+            return b''.join(self.__quantized_properties.values())
+
+        positions, ups, rights, scales = self.__frames
+        return np.concatenate([
+            positions.ravel(), ups.ravel(), rights.ravel(), scales.ravel()]).astype("<f4").tobytes()
+
+    @cached_property
+    def __frames(self):
+        return utils.decompose(self.__matrices)
+
+    @cached_property
+    def __volume(self):
+        positions = self.__frames[0]
+        offset = positions.min(axis=0)
+        return offset, positions.max(axis=0) - offset
+
+    @cached_property
+    def __quantized_properties(self):
+        # 4 字节的 float 在前，2 字节的 uint16 在后，保证各属性按分量大小对齐
+        positions, ups, rights, scales = self.__frames
+        properties = {}
+        if not np.allclose(scales, 1):
+            if np.allclose(scales, scales[:, :1]):
+                properties["SCALE"] = scales[:, 0].astype("<f4").tobytes()
+            else:
+                properties["SCALE_NON_UNIFORM"] = scales.astype("<f4").tobytes()
+        properties["NORMAL_UP_OCT32P"] = oct_encode(ups).tobytes()
+        properties["NORMAL_RIGHT_OCT32P"] = oct_encode(rights).tobytes()
+
+        offset, size = self.__volume
+        step = np.where(size > 0, QUANTIZED_MAX / np.where(size > 0, size, 1), 0)
+        properties["POSITION_QUANTIZED"] = np.rint(
+            (positions - offset) * step).astype("<u2").tobytes()
+        return properties
+
+    def __quantized_json(self):
+        offset, size = self.__volume
+        ret = {
+            "INSTANCES_LENGTH": len(self.__matrices),
+            "QUANTIZED_VOLUME_OFFSET": offset.tolist(),
+            "QUANTIZED_VOLUME_SCALE": size.tolist()
+        }
+        byte_offset = 0
+        for name, data in self.__quantized_properties.items():
+            ret[name] = {"byteOffset": byte_offset}
+            byte_offset += len(data)
+        return json.dumps(ret, separators=(",", ":")).encode("utf-8")
+
+    def _header_tail(self) -> bytes:
+        return utils.int_to_bytes(I3dm.GLTF_FORMAT)
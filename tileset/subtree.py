@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import utils
+
+
+class Subtree:
+    """隐式分块的 .subtree 文件：tile、content 与子 subtree 的可用性位流"""
+    __MAGIC = b'subt'
+    VERSION = 1
+    __HEADER_LEN = 24
+
+    def __init__(self, tile_availability, content_availability, child_subtree_availability) -> None:
+        # 均为按层级依次排列、层内按 Morton 序的 bool 数组
+        self.__tile_availability = tile_availability
+        self.__content_availability = content_availability
+        self.__child_subtree_availability = child_subtree_availability
+
+    def segments(self) -> list:
+        buffer_views = []
+        bitstreams = []
+        offset = 0
+
+        def availability(bits):
+            nonlocal offset
+            count = int(np.count_nonzero(bits))
+            if count == 0 or count == len(bits):
+                return {"constant": int(count > 0)}
+            data = np.packbits(bits, bitorder="little").tobytes()
+            buffer_views.append({"buffer": 0, "byteOffset": offset, "byteLength": len(data)})
+            bitstreams.append(data)
+            # bufferView 按 8 字节对齐
+            offset += utils.padded_len(len(data), padding=8)
+            return {"bitstream": len(buffer_views) - 1, "availableCount": count}
+
+        subtree = {
+            "tileAvailability": availability(self.__tile_availability),
+            "contentAvailability": [availability(self.__content_availability)],
+            "childSubtreeAvailability": availability(self.__child_subtree_availability)
+        }
+        if buffer_views:
+            subtree = {"buffers": [{"byteLength": offset}], "bufferViews": buffer_views, **subtree}
+
+        json_bytes = json.dumps(subtree, separators=(",", ":")).encode("utf-8")
+        json_len = utils.padded_len(len(json_bytes), padding=8)
+        header = bytearray(Subtree.__MAGIC)
+        header += utils.int_to_bytes(Subtree.VERSION)
+        header += json_len.to_bytes(8, "little")
+        header += offset.to_bytes(8, "little")
+        segments = [header, json_bytes, b' ' * (json_len - len(json_bytes))]
+        for data in bitstreams:
+            segments += [data, b'\0' * (utils.padded_len(len(data), padding=8) - len(data))]
+        return segments
@@ -1,12 +1,24 @@
 from .b3dm import B3dm
 from .i3dm import I3dm
+from .gltf_content import GltfContent
 from functools import cached_property
-from utils import Box3, Matrix4
+import numpy as np
+from utils import Box3, BoxArray, Matrix4
 from enum import Enum
 from gltf import Gltf, Axis
+from gltf.gltf import MAT_Y, MAT_Z
 
 FOOT_TO_METER_MULTIPLIER = 0.3048
 MILLIMETER_TO_METER_MULTIPLIER = 0.001
+# 3D Tiles 运行时对 glTF 施加的 y-up -> z-up 旋转
+Y_UP_TO_Z_UP = np.array([
+    [1., 0., 0., 0.],
+    [0., 0., -1., 0.],
+    [0., 1., 0., 0.],
+    [0., 0., 0., 1.]
+])
+# z-up 时 transform 按列主序展开后的元素次序
+Z_UP_TRANSFORM = [9, 8, 10, 11, 5, 4, 6, 7, 1, 0, 2, 3, 14, 12, 13, 15]
 
 class Measure(str, Enum):
     METER = "meter"
@@ -14,10 +26,49 @@ class Measure(str, Enum):
     MILLIMETER = "millimeter"
 
 
+class Format(str, Enum):
+    # 3D Tiles 1.0 的 b3dm/i3dm，或 3D Tiles 1.1 直接引用的 glb（多实例用 EXT_mesh_gpu_instancing）
+    B3DM = "b3dm"
+    GLB = "glb"
+
+
+def transform_list(matrix):
+    t = matrix.list
+    if Gltf.up_direction is Axis.Z:
+        return [t[i] for i in Z_UP_TRANSFORM]
+    return t
+
+
+def tile_transforms(matrices, instanced=None):
+    """(N,4,4) 世界矩阵的 mesh 单独成 tile 时的 transform：z-up 时按 Z_UP_TRANSFORM 换算
+
+    单位矩阵不写 transform，不做换算；instanced 标记的行按 i3dm 实例处理，也不做换算
+    """
+    transforms = matrices
+    if Gltf.up_direction is Axis.Z:
+        swizzled = matrices.transpose(0, 2, 1).reshape(-1, 16)[:, Z_UP_TRANSFORM]
+        swizzled = swizzled.reshape(-1, 4, 4).transpose(0, 2, 1)
+        keep = (matrices == np.eye(4)).all(axis=(1, 2))
+        if instanced is not None:
+            keep |= instanced
+        transforms = np.where(keep[:, None, None], matrices, swizzled)
+    return transforms
+
+
+def content_matrices(matrices, instanced=None):
+    """(N,4,4) 世界矩阵的 mesh 单独成 tile 时，内容在 tileset 坐标系中的矩阵：transform * R * up
+
+    instanced 标记的行按 i3dm 实例处理：instance * R * up
+    """
+    up = Matrix4(MAT_Y if Gltf.up_direction is Axis.Y else MAT_Z).matrix
+    return tile_transforms(matrices, instanced) @ Y_UP_TO_Z_UP @ up
+
+
 class Tile:
     measure = Measure.METER
+    format = Format.B3DM
 
-    def __init__(self, *, content_id=None, refine=None, matrix=Matrix4(), box=Box3(), instance_box=Box3(), instances_matrices=None, gltf=None, extras=None) -> None:
+    def __init__(self, *, content_id=None, refine=None, matrix=Matrix4(), box=Box3(), instance_box=Box3(), instances_matrices=None, gltf=None, extras=None, batch=None, batch_matrices=None, batch_instanced=None, part=None) -> None:
         self.refine = refine
         self.__content_id = content_id
         # self.__content = None
@@ -28,6 +79,19 @@ class Tile:
         self.__children = []
         self.__gltf = gltf
         self.__extras = extras
+        # 合批 tile：batch 为合并的 mesh id，batch_matrices 为各 mesh 的世界矩阵
+        self.__batch = batch
+        self.__batch_matrices = batch_matrices
+        # 合批中来自多实例 mesh 的成员，与 i3dm 一致放置
+        self.__batch_instanced = batch_instanced
+        # 大 mesh 切分出的部分：(mesh id, 各 primitive 的三角形序号)
+        self.__part = part
+        # 内部节点的简化代理几何 (平移, 顶点, 三角形, 材质) 与对应的几何误差
+        self.__lod = None
+        self.__lod_error = 0
+        # (box, box_world, geometric_error) 的缓存，由 update 自底向上填充
+        self.__bounds = None
+        self.__parent = None
         # self.__parse_children()
 
     def add_child(self, tile):
@@ -35,7 +99,8 @@ class Tile:
             return self
 
         self.__children.append(tile)
-        self.__box.union(tile.box_world)
+        tile.__parent = self
+        self.__invalidate()
         return self
 
     def add_children(self, children):
@@ -47,31 +112,147 @@ class Tile:
         return self
 
     def add_content_matrix(self, matrix):
-        self.__content_matrices.append(matrix)
+        self.__content_matrices = np.concatenate([self.__content_matrices, matrix.matrix[None]])
+        self.__invalidate()
+
+    def set_lod(self, content_id, lod, geometric_error):
+        # 有代理内容的节点在子节点加载后被替换
+        self.__content_id = content_id
+        self.__lod = lod
+        self.__lod_error = geometric_error
+        self.refine = "REPLACE"
+        self.__invalidate()
+        return self
+
+    def __getstate__(self):
+        # 多进程写出内容时只需要内容本身：不序列化父子节点，否则每个 tile 都会带上整棵树
+        state = self.__dict__.copy()
+        state["_Tile__parent"] = None
+        state["_Tile__children"] = []
+        state["_Tile__bounds"] = None
+        return state
+
+    def __invalidate(self):
+        # 只清除到根的路径；父节点的缓存总是晚于子节点建立，遇到未缓存的节点即可停止
+        tile = self
+        while tile is not None and tile.__bounds is not None:
+            tile.__bounds = None
+            tile = tile.__parent
+
+    def update(self):
+        """自底向上一次性计算子树中失效的包围盒与几何误差"""
+        stack = [(self, False)]
+        while stack:
+            tile, visited = stack.pop()
+            if tile.__bounds is not None:
+                continue
+            if visited:
+                tile.__bounds = tile.__compute_bounds()
+            else:
+                stack.append((tile, True))
+                stack.extend((child, False) for child in tile.__children)
+        return self
+
+    def __compute_bounds(self):
+        box = self.__box.clone()
+        for child in self.__children:
+            box.union(child.box_world)
+        if self.__lod is not None:
+            geometric_error = self.__lod_error
+        elif self.__content_id is not None:
+            box.union(self.__content_box)
+            geometric_error = Tile.to_meter(self.__instance_box.diagonal)
+        else:
+            geometric_error = max((child.geometric_error for child in self.__children), default=0)
+        return box, box.clone().apply_matrix4(self.matrix.matrix), geometric_error
+
+    @staticmethod
+    def to_meter(length):
+        if Tile.measure is Measure.FOOT:
+            return length * FOOT_TO_METER_MULTIPLIER
+        elif Tile.measure is Measure.MILLIMETER:
+            return length * MILLIMETER_TO_METER_MULTIPLIER
+        return length
+
+    @property
+    def content_id(self):
+        return self.__content_id
+
+    @property
+    def batch(self):
+        return self.__batch
+
+    @property
+    def part(self):
+        return self.__part
+
+    @property
+    def lod(self):
+        return self.__lod
+
+    @property
+    def extras(self):
+        return self.__extras
+
+    @property
+    def instances_matrices(self):
+        return self.__content_matrices
+
+    @property
+    def instanced(self):
+        return self.__content_matrices is not None and 1 < len(self.__content_matrices)
+
+    @property
+    def gltf_instance_matrices(self):
+        # 多实例内容的实例矩阵换到 glTF 坐标系：R * instance' = instance * R * up，与 i3dm 显示一致
+        up = Matrix4(MAT_Y if Gltf.up_direction is Axis.Y else MAT_Z).matrix
+        return np.linalg.inv(Y_UP_TO_Z_UP) @ self.__content_matrices @ Y_UP_TO_Z_UP @ up
 
     @property
+    def batch_node_matrices(self):
+        # 合批内容没有 tile transform，各 mesh 单独成 tile 时的 transform 改放到 glTF 节点上：
+        # R * node = transform * R * up，R 为运行时的 y-up -> z-up 旋转，up 为单独输出时的根节点矩阵
+        up = Matrix4(MAT_Y if Gltf.up_direction is Axis.Y else MAT_Z).matrix
+        r_inv = np.linalg.inv(Y_UP_TO_Z_UP)
+        # 单独输出时单位矩阵不写 transform，不做 z-up 换算；多实例 mesh 的实例按 i3dm 也不做换算
+        instanced = self.__batch_instanced or [False] * len(self.__batch_matrices)
+        transforms = [matrix if matrix.is_identity or keep else Matrix4(transform_list(matrix))
+                      for matrix, keep in zip(self.__batch_matrices, instanced)]
+        return [(r_inv @ transform.matrix @ Y_UP_TO_Z_UP @ up).reshape(-1, order="F").tolist()
+                for transform in transforms]
+
+    @cached_property
     def content(self):
+        return self.create_content(self.__gltf)
+
+    def create_content(self, gltf):
+        if Tile.format is Format.GLB:
+            if gltf is not None and self.__extras:
+                # 没有批量表，extras 放在 glTF 根上，按要素 id 排列
+                gltf.extras = self.__extras
+            return GltfContent(str(self.__content_id), gltf)
+        if self.__lod is not None:
+            return B3dm(str(self.__content_id), gltf)
+        if self.__batch:
+            return B3dm(str(self.__content_id), gltf, batch_length=len(self.__batch), extras=self.__extras)
         if 1 < len(self.__content_matrices):
             return I3dm(str(self.__content_id),
-                        self.__gltf, self.__content_matrices, extras=self.__extras)
+                        gltf, self.__content_matrices, extras=self.__extras)
         else:
-            return B3dm(str(self.__content_id), self.__gltf, extras=self.__extras)
+            return B3dm(str(self.__content_id), gltf, extras=self.__extras)
 
     @property
     def __content_matrix(self):
-        if self.__content_matrices and 1 == len(self.__content_matrices):
-            return self.__content_matrices[0]
+        if self.__content_matrices is not None and 1 == len(self.__content_matrices):
+            return Matrix4(self.__content_matrices[0])
 
         return Matrix4()
 
     @property
     def __content_box(self):
         if self.__content_matrices is not None and 1 < len(self.__content_matrices):
-            box = Box3()
-            for matrix in self.__content_matrices:
-                box.union(
-                    self.__instance_box.clone().apply_matrix4(matrix.matrix))
-            return box
+            box = self.__instance_box
+            return BoxArray(box.min, box.max).apply_matrix4(self.__content_matrices).bounds()
 
         return self.__instance_box
 
@@ -89,6 +270,7 @@ class Tile:
 
     def apply_matrix4(self, matrix):
         self.__matrix.premultiply(matrix)
+        self.__invalidate()
         return self
 
     @property
@@ -97,19 +279,11 @@ class Tile:
 
     @property
     def box(self):
-        return self.__box if self.__content_id is None else self.__box.clone().union(self.__content_box)
+        return self.update().__bounds[0]
 
-    @cached_property
+    @property
     def box_world(self):
-        debug = self.__content_id == 2
-        res = self.box.clone().apply_matrix4(self.matrix.matrix, debug)
-        # if debug:
-        #     print(2, self.box.list)
-        #     print(2, self.__matrix.matrix)
-        #     print(2, self.__content_matrix.matrix)
-        #     print(2, self.matrix.matrix)
-        #     print(2, res.list)
-        return res
+        return self.update().__bounds[1]
 
     @property
     def centroid_world(self):
@@ -117,15 +291,7 @@ class Tile:
 
     @property
     def geometric_error(self):
-        if self.__content_id is None:
-            return max(list(map(lambda tile: tile.geometric_error, self.__children)))
-
-        if Tile.measure is Measure.FOOT:
-            return self.__instance_box.diagonal * FOOT_TO_METER_MULTIPLIER
-        elif Tile.measure is Measure.MILLIMETER:
-            return self.__instance_box.diagonal * MILLIMETER_TO_METER_MULTIPLIER
-
-        return self.__instance_box.diagonal
+        return self.update().__bounds[2]
 
     @property
     def dict(self):
@@ -139,7 +305,7 @@ class Tile:
             box[2] = box[1]
             box[1] = box[0]
             box[0] = tmp
-            if self.__content_id is None:
+            if self.__content_id is None or self.__batch or self.__lod is not None:
                 tmp = box[11]
                 box[11] = box[7]
                 box[7] = box[3]
@@ -152,15 +318,7 @@ class Tile:
         ret["boundingVolume"] = {"box": box}
 
         if not self.matrix.is_identity:
-            ret["transform"] = self.matrix.list
-            if Gltf.up_direction is Axis.Z:
-                t = ret["transform"]
-                ret["transform"] = [
-                    t[9], t[8], t[10], t[11],
-                    t[5], t[4], t[6], t[7],
-                    t[1], t[0], t[2], t[3],
-                    t[14], t[12], t[13], t[15]
-                ]
+            ret["transform"] = transform_list(self.matrix)
 
         if self.__content_id is not None:
             ret["content"] = self.content.dict
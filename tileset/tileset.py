@@ -1,4 +1,9 @@
 
+from collections import deque
+from pathlib import PurePath
+from .tile import Tile, Format
+
+
 class Tileset:
     ASSET = {"version": "1.0",
              "tilesetVersion": "1.0.0.0"}
@@ -12,8 +17,60 @@ class Tileset:
 
     @ property
     def dict(self):
+        return Tileset.as_dict(self.root.dict)
+
+    @staticmethod
+    def as_dict(root):
+        asset = Tileset.ASSET
+        if Tile.format is Format.GLB:
+            # glb 内容是 3D Tiles 1.1 的特性
+            asset = {**asset, "version": "1.1"}
         return {
-            "asset": Tileset.ASSET,
-            "geometricError": self.geometric_error,
-            "root": self.root.dict
+            "asset": asset,
+            "geometricError": root["geometricError"],
+            "root": root
         }
+
+    def split(self, uri, max_depth=0, max_nodes=0):
+        """把 tile 树切成多个外部 tileset，返回 [(文件名, tileset dict)]，第一个为主 tileset uri
+
+        每个文件按广度优先展开 tile，超过 max_depth 层或 max_nodes 个 tile 后，
+        有子节点的 tile 改为引用同目录下 <uri 主名>_<n>.json 的外部 tileset
+        """
+        root = self.root.dict
+        if not (max_depth or max_nodes):
+            return [(uri, Tileset.as_dict(root))]
+
+        name = PurePath(uri).stem
+        tilesets = []
+        pending = deque([(uri, root, None)])
+        while pending:
+            uri, root, refine = pending.popleft()
+            if refine and "refine" not in root:
+                # 外部 tileset 的根节点必须给出 refine
+                root["refine"] = refine
+            tilesets.append((uri, Tileset.as_dict(root)))
+            count = 1
+            queue = deque([(root, 0, refine)])
+            while queue:
+                tile, depth, refine = queue.popleft()
+                refine = tile.get("refine", refine)
+                children = tile.get("children", [])
+                for index, child in enumerate(children):
+                    full = (max_depth and depth + 1 >= max_depth) or (max_nodes and count >= max_nodes)
+                    if full and child.get("children"):
+                        children[index] = Tileset.__reference(child, f"{name}_{len(tilesets) + len(pending)}.json")
+                        pending.append((children[index]["content"]["uri"], child, refine))
+                    else:
+                        queue.append((child, depth + 1, refine))
+                    count += 1
+
+        return tilesets
+
+    @staticmethod
+    def __reference(tile, uri):
+        # 引用外部 tileset 的 tile 保留原 transform，外部 tileset 的根节点相对它不再变换
+        reference = {key: tile[key] for key in ("geometricError", "boundingVolume", "transform") if key in tile}
+        reference["content"] = {"uri": uri}
+        tile.pop("transform", None)
+        return reference
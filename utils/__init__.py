@@ -1,3 +1,3 @@
-from .box import Box3
-from .matrix import Matrix4
-from .misc import int_to_bytes, padded_len, camel_to_snake, snake_to_camel
+from .box import Box3, BoxArray
+from .matrix import Matrix4, decompose, trs
+from .misc import int_to_bytes, padded_len, segments_len, write_segments, segments_digest, camel_to_snake, snake_to_camel
@@ -54,34 +54,87 @@ class Box3:
         self.__min = np.array([math.inf] * 3)
         self.__max = np.array([-math.inf] * 3)
 
-    def apply_matrix4(self, matrix, debug = False):
-        points = [[*self.__min, 1],
-                  [self.__min[0], self.__min[1], self.__max[2], 1],
-                  [self.__min[0], self.__max[1], self.__min[2], 1],
-                  [self.__min[0], self.__max[1], self.__max[2], 1],
-                  [self.__max[0], self.__min[1], self.__min[2], 1],
-                  [self.__max[0], self.__min[1], self.__max[2], 1],
-                  [self.__max[0], self.__max[1], self.__min[2], 1],
-                  [*self.__max, 1]]
+    def apply_matrix4(self, matrix):
+        points = corners(self.__min, self.__max)
         self.clear()
-        if debug:
-            m = matrix
-            matrix = np.array([
-                # m[0][0], m[1][0], m[2][0], m[3][0],
-                # m[0][1], m[1][1], m[2][1], m[3][1],
-                # m[0][2], m[1][2], m[2][2], m[3][2],
-                # m[0][3], m[1][3], m[2][3], m[3][3]
-
-                m[2][1], m[1][1], m[0][1], m[3][2],
-                m[2][0], m[1][0], m[0][0], m[3][0],
-                m[2][2], m[1][2], m[0][2], m[3][1],
-                m[2][3], m[1][3], m[0][3], m[3][3]
-            ]).reshape(4, 4, order="F")
-        for point in points:
-            new_point = (matrix @ point)[0:3]
-            if debug:
-                print(f"point: {point} -> {new_point}")
-            self.expand_by_point(new_point)
-        if debug:
-            print(f"box: {self.list}")
+        new_points = (matrix @ points[..., None])[:, 0:3, 0]
+        self.__min = new_points.min(axis=0)
+        self.__max = new_points.max(axis=0)
         return self
+
+
+def corners(min, max):
+    """包围盒的 8 个角点（齐次坐标），min/max 为 (3,) 或 (N,3)，返回 (8,4) 或 (N,8,4)"""
+    min = np.asarray(min, dtype=np.float64)
+    max = np.asarray(max, dtype=np.float64)
+    bits = np.array([[i >> 2 & 1, i >> 1 & 1, i & 1] for i in range(8)], dtype=bool)
+    points = np.where(bits, max[..., None, :], min[..., None, :])
+    return np.concatenate([points, np.ones(points.shape[:-1] + (1,))], axis=-1)
+
+
+def surface_area(size):
+    # SAH 使用的半表面积
+    return size[..., 0] * size[..., 1] + size[..., 1] * size[..., 2] + size[..., 2] * size[..., 0]
+
+
+class BoxArray:
+    """N 个包围盒的结构数组，min/max 为 (N,3)，运算均批量进行"""
+
+    def __init__(self, min, max) -> None:
+        self.min = np.asarray(min, dtype=np.float64).reshape(-1, 3)
+        self.max = np.asarray(max, dtype=np.float64).reshape(-1, 3)
+
+    @staticmethod
+    def from_boxes(boxes):
+        boxes = list(boxes)
+        return BoxArray([box.min for box in boxes], [box.max for box in boxes])
+
+    def __len__(self):
+        return len(self.min)
+
+    def __getitem__(self, index):
+        return BoxArray(self.min[index], self.max[index])
+
+    def box(self, index):
+        return Box3(self.min[index], self.max[index])
+
+    @property
+    def center(self):
+        return (self.max + self.min) / 2
+
+    @property
+    def size(self):
+        return abs(self.max - self.min)
+
+    @property
+    def diagonal(self):
+        return np.sqrt((self.size ** 2).sum(axis=1))
+
+    @property
+    def surface_area(self):
+        return surface_area(self.size)
+
+    def union(self, other):
+        return BoxArray(np.minimum(self.min, other.min), np.maximum(self.max, other.max))
+
+    def bounds(self):
+        """所有包围盒的并集"""
+        if not len(self):
+            return Box3()
+        return Box3(self.min.min(axis=0), self.max.max(axis=0))
+
+    def accumulate(self, reverse=False):
+        """前缀并集，reverse 时为后缀并集：第 i 个为 [0, i] 或 [i, N) 的并集"""
+        if reverse:
+            return self[::-1].accumulate()[::-1]
+        return BoxArray(np.minimum.accumulate(self.min), np.maximum.accumulate(self.max))
+
+    def contains(self, other):
+        return (self.min <= other.min).all(axis=-1) & (other.max <= self.max).all(axis=-1)
+
+    def apply_matrix4(self, matrices):
+        """按 (4,4) 或 (M,4,4) 矩阵变换，单个包围盒可对多个矩阵广播"""
+        # 逐点矩阵乘向量，结果与 Box3.apply_matrix4 逐位一致
+        matrices = np.asarray(matrices)[..., None, :, :]
+        points = (matrices @ corners(self.min, self.max)[..., None])[..., 0:3, 0]
+        return BoxArray(points.min(axis=-2), points.max(axis=-2))
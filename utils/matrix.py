@@ -101,3 +101,35 @@ class Matrix4:
     @property
     def is_identity(self):
         return (self.__matrix == Matrix4().matrix).all()
+
+
+def decompose(matrices):
+    """对 (N,4,4) 矩阵批量求 position, up, right, scale，与 Matrix4 的同名属性一致"""
+    linear = matrices[:, 0:3, 0:3]
+    scale = np.sqrt((linear ** 2).sum(axis=1))
+    scale[:, 0] = np.where(np.linalg.det(matrices) < 0, -scale[:, 0], scale[:, 0])
+    normal = np.linalg.inv(linear).transpose(0, 2, 1) * scale[:, None, :]
+    return matrices[:, 0:3, 3], normal[:, :, 1], normal[:, :, 0], scale
+
+
+def trs(matrices):
+    """对 (N,4,4) 矩阵批量分解为 translation, rotation (x, y, z, w 四元数), scale；行列式为负时 x 轴缩放取负"""
+    linear = matrices[:, 0:3, 0:3]
+    scale = np.sqrt((linear ** 2).sum(axis=1))
+    scale[:, 0] = np.where(np.linalg.det(linear) < 0, -scale[:, 0], scale[:, 0])
+    r = linear / np.where(scale == 0, 1, scale)[:, None, :]
+    # Shepperd 方法：以 w, x, y, z 中最大的分量为基准求其余分量，避免 180° 附近的符号错误
+    m00, m11, m22 = r[:, 0, 0], r[:, 1, 1], r[:, 2, 2]
+    squares = np.stack([1 + m00 + m11 + m22, 1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22], axis=1)
+    k = np.sqrt(np.maximum(squares, 1e-12))
+    d21, d02, d10 = r[:, 2, 1] - r[:, 1, 2], r[:, 0, 2] - r[:, 2, 0], r[:, 1, 0] - r[:, 0, 1]
+    s10, s02, s21 = r[:, 1, 0] + r[:, 0, 1], r[:, 0, 2] + r[:, 2, 0], r[:, 2, 1] + r[:, 1, 2]
+    candidates = np.stack([
+        np.stack([d21, d02, d10, squares[:, 0]], axis=1) / k[:, 0:1],
+        np.stack([squares[:, 1], s10, s02, d21], axis=1) / k[:, 1:2],
+        np.stack([s10, squares[:, 2], s21, d02], axis=1) / k[:, 2:3],
+        np.stack([s02, s21, squares[:, 3], d10], axis=1) / k[:, 3:4],
+    ], axis=1)
+    rotation = candidates[np.arange(len(r)), squares.argmax(axis=1)]
+    rotation /= np.linalg.norm(rotation, axis=1, keepdims=True)
+    return matrices[:, 0:3, 3], rotation, scale
@@ -1,3 +1,4 @@
+import hashlib
 import math
 import re
 
@@ -10,6 +11,22 @@ def padded_len(length, *, padding=4) -> int:
     return math.ceil(length / padding) * padding
 
 
+def segments_len(segments) -> int:
+    return sum(len(segment) for segment in segments)
+
+
+def write_segments(f, segments):
+    # 分段写出（类似 writev），不先拼接成一个大 bytes
+    f.writelines(segments)
+
+
+def segments_digest(segments) -> str:
+    digest = hashlib.sha1()
+    for segment in segments:
+        digest.update(segment)
+    return digest.hexdigest()
+
+
 CAMEL_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
 CONST_PATTERN = re.compile(r'^([A-Z]|[0-0]|_)*$')
 
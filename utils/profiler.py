@@ -0,0 +1,147 @@
+import cProfile
+import heapq
+import json
+import os
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource，不记录 RSS
+    resource = None
+
+
+def cpu_time():
+    # 包括已结束的子进程（进程池关闭后回收），多进程写出时也能统计到
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def rss_peak():
+    """进程启动以来的 RSS 峰值（字节），只增不减"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class Records:
+    """子进程内记录各内容的耗时，按任务取出后返回给主进程"""
+
+    def __init__(self):
+        self.__records = []
+
+    def content(self, *record):
+        self.__records.append(record)
+
+    def take(self):
+        records, self.__records = self.__records, []
+        return records
+
+
+def peak_growth(before, after):
+    return None if before is None else after - before
+
+
+class Profiler:
+    """按阶段记录墙钟时间、CPU 时间与进程 RSS 峰值的增长，以及计数器和最慢的内容
+
+    memory 时另用 tracemalloc 记录各阶段的 Python 分配峰值，跟踪分配会拖慢转换，计时也包含这部分开销。
+    未启用时各方法都不做任何事，转换代码无需判断
+    """
+
+    def __init__(self, enabled=False, *, slowest=10, cprofile_stage=None, memory=False):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.slowest = slowest
+        self.cprofile_stage = cprofile_stage
+        self.stages = []
+        self.counters = {}
+        self.__contents = []
+        self.__cprofile = None
+        self.__start = None
+
+    def start(self):
+        if self.memory:
+            # 映射的文件不经过 Python 分配器，不计入 tracemalloc
+            tracemalloc.start()
+        if self.enabled:
+            self.__start = (timeit.default_timer(), cpu_time())
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.memory and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        profile = None
+        if name == self.cprofile_stage:
+            profile = self.__cprofile = cProfile.Profile()
+            profile.enable()
+        wall, cpu, rss = timeit.default_timer(), cpu_time(), rss_peak()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            process_peak = rss_peak()
+            stage = {
+                "name": name,
+                "wall": timeit.default_timer() - wall,
+                "cpu": cpu_time() - cpu,
+                # 进程的 RSS 峰值只增不减：本阶段把峰值抬高了多少，以及阶段结束时整个进程的峰值
+                "rss_peak_growth": peak_growth(rss, process_peak),
+                "process_rss_peak": process_peak
+            }
+            if self.memory:
+                stage["tracemalloc_peak"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(stage)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def content(self, uri, meshes, seconds, byte_length):
+        """记录一个内容的切分、编码与写出耗时，只保留最慢的 slowest 个"""
+        if not self.enabled:
+            return
+        self.count("contents")
+        self.count("content_bytes", byte_length)
+        item = (seconds, uri, meshes, byte_length)
+        if len(self.__contents) < self.slowest:
+            heapq.heappush(self.__contents, item)
+        elif self.__contents and item > self.__contents[0]:
+            heapq.heapreplace(self.__contents, item)
+
+    @property
+    def report(self):
+        wall, cpu = self.__start or (timeit.default_timer(), cpu_time())
+        return {
+            "wall": timeit.default_timer() - wall,
+            "cpu": cpu_time() - cpu,
+            # 计时是否包含 tracemalloc 的开销
+            "memory_tracing": self.memory,
+            "stages": self.stages,
+            "counters": self.counters,
+            "slowest_contents": [
+                {"uri": uri, "meshes": meshes, "seconds": seconds, "bytes": byte_length}
+                for seconds, uri, meshes, byte_length in sorted(self.__contents, reverse=True)]
+        }
+
+    def write(self, path, **info):
+        """写出 json 报告；指定了 cProfile 阶段时在旁边写出 <报告名>.<阶段>.prof"""
+        if not self.enabled:
+            return
+        if self.memory:
+            tracemalloc.stop()
+        with open(path, "w") as f:
+            json.dump({**info, **self.report}, f, indent=2)
+        if self.__cprofile is not None:
+            self.__cprofile.dump_stats(Path(path).with_suffix(f".{self.cprofile_stage}.prof"))